@@ -1,8 +1,13 @@
-import pandas as pd
+import os
+import sys
 import matplotlib.pyplot as plt
 
+# Lectura con caché columnar (parte_2/codigoboost/csv_cache.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parte_2', 'codigoboost'))
+from csv_cache import read_csv_cached
+
 # Cargar el CSV
-df = pd.read_csv("RentaMedia_limpio.csv", sep=',', encoding='utf-8')
+df = read_csv_cached("RentaMedia_limpio.csv")
 
 print(df.columns)
 # Ordenar los datos de manera descendente por la columna 'Total' y seleccionar los primeros 10
@@ -1,12 +1,17 @@
-import pandas as pd
+import os
+import sys
 from geopy.geocoders import Nominatim
 import matplotlib.pyplot as plt
 import geopandas as gpd
 from shapely.geometry import Point
 
+# Lector común de CSV (formato detectado una vez) en parte_2/codigoboost
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parte_2', 'codigoboost'))
+from ine_csv import read_ine_csv
+
 # Cargar el archivo CSV
 file_path = r'C:\Users\emmah\OneDrive\Escritorio\UNI\TERCER\DataCoop25\3tops\municipios_priorizados_unicos.csv'  # Asegúrate de poner la ruta correcta
-df = pd.read_csv(file_path)
+df = read_ine_csv(file_path)
 
 # Ordenar por la columna 'score_total' para obtener los tres municipios más ponderados
 df_top_3 = df.sort_values(by='score_total', ascending=False).head(3)
@@ -1,17 +1,24 @@
+import os
+import sys
 import pandas as pd
 import geopandas as gpd
 import numpy as np
 
+# Lector común de CSV (formato detectado una vez) en parte_2/codigoboost
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parte_2', 'codigoboost'))
+from ine_csv import read_ine_csv
+from csv_cache import read_csv_cached
+from schema import pack_code, code_strings
+
 print("Cargando datos...")
 
 # 1. Cargar datos de bancos por municipio
 try:
-    bancos_municipio = pd.read_csv('bancos_por_municipio.csv')
+    bancos_municipio = read_csv_cached('bancos_por_municipio.csv', dtype={'CPRO': str, 'CMUN': str})
     print(f"Datos de bancos cargados: {len(bancos_municipio)} municipios")
     
-    # Asegurar formato correcto de códigos
-    bancos_municipio['CPRO'] = bancos_municipio['CPRO'].astype(str).str.zfill(2)
-    bancos_municipio['CMUN'] = bancos_municipio['CMUN'].astype(str).str.zfill(3)
+    # Código de municipio empaquetado (CPRO*1000+CMUN) para los cruces
+    bancos_municipio['CODMUN'] = pack_code(bancos_municipio['CPRO'], bancos_municipio['CMUN'])
 except Exception as e:
     print(f"Error al cargar bancos_por_municipio.csv: {e}")
     bancos_municipio = pd.DataFrame()
@@ -24,12 +31,12 @@ try:
     # Renombrar columnas según la estructura observada
     poblacion.columns = ['CPRO', 'PROVINCIA', 'CMUN', 'NOMBRE', 'POB24', 'HOMBRES', 'MUJERES']
 
-    # Eliminar filas no válidas (fila de cabecera que aparece como dato)
-    poblacion = poblacion[poblacion['CPRO'].astype(str).str.strip() != 'CPRO']
+    # Eliminar filas no válidas (fila de cabecera que aparece como dato, notas al pie)
+    poblacion = poblacion[pd.to_numeric(poblacion['CPRO'], errors='coerce').notna()].copy()
 
-    # Convertir tipos y rellenar ceros en códigos
-    poblacion['CPRO'] = poblacion['CPRO'].astype(str).str.zfill(2)
-    poblacion['CMUN'] = poblacion['CMUN'].astype(str).str.zfill(3)
+    # Código empaquetado para los cruces; CPRO/CMUN con ceros solo para las salidas CSV
+    poblacion['CODMUN'] = pack_code(poblacion['CPRO'], poblacion['CMUN'])
+    poblacion['CPRO'], poblacion['CMUN'] = code_strings(poblacion['CODMUN'])
     poblacion['POB24'] = pd.to_numeric(poblacion['POB24'], errors='coerce').fillna(0).astype(int)
 
     print(f"\nDatos de población cargados: {len(poblacion)} registros")
@@ -41,7 +48,7 @@ except Exception as e:
 
 # 3. Cargar datos de renta por municipio (o usar datos provinciales como proxy si es necesario)
 try:
-    renta = pd.read_csv('renta media.csv', sep=';', encoding='latin1')
+    renta = read_ine_csv('renta media.csv', numeric=['Total'])
     print(f"Datos de renta cargados: {len(renta)} registros")
 
     # Reutilizamos el proceso para extraer código CPRO desde el nombre de provincia
@@ -71,7 +78,7 @@ try:
 
     renta = renta[renta['Provincias'].notna()]
     renta['CPRO'] = renta['Provincias'].apply(extract_cpro_from_name)
-    renta['renta_media'] = pd.to_numeric(renta['Total'].astype(str).str.replace(',', '.'), errors='coerce')
+    renta['renta_media'] = renta['Total']
     renta = renta[renta['CPRO'].notna() & renta['renta_media'].notna()]
     print(f"Datos de renta procesados: {len(renta)} provincias con datos válidos")
 except Exception as e:
@@ -84,13 +91,13 @@ print("\nPreparando análisis...")
 # Crear DataFrame base con todos los municipios de población
 if not poblacion.empty:
     # Usar POB24 como población total
-    municipios = poblacion[['CPRO', 'CMUN', 'NOMBRE', 'POB24', 'PROVINCIA']].copy()
+    municipios = poblacion[['CODMUN', 'CPRO', 'CMUN', 'NOMBRE', 'POB24', 'PROVINCIA']].copy()
     municipios = municipios.rename(columns={'POB24': 'Poblacion'})
     
     # Añadir información de bancos (0 si no hay datos)
     municipios = municipios.merge(
-        bancos_municipio[['CPRO', 'CMUN', 'num_bancos']], 
-        on=['CPRO', 'CMUN'], 
+        bancos_municipio[['CODMUN', 'num_bancos']], 
+        on='CODMUN', 
         how='left'
     )
     municipios['num_bancos'] = municipios['num_bancos'].fillna(0)
@@ -103,7 +110,7 @@ if not poblacion.empty:
 
     # --- Mapear precio de alquiler por provincia (alquiler_municipio.csv) ---
     try:
-        alquiler = pd.read_csv('alquiler_municipio.csv', sep=',', encoding='utf-8', engine='python', header=None)
+        alquiler = read_ine_csv('alquiler_municipio.csv', header=None)
         alquiler.columns = ['Localizacion', 'Precio_m2', 'V1', 'V2', 'V3', 'V4', 'V5']
 
         # Normalizar texto helper
@@ -261,16 +268,13 @@ if not poblacion.empty:
         # Cargar geometrías de municipios (shapefile)
         muni_gdf = gpd.read_file('cartografia_censo2011_nacional/')
 
-        # Normalizar códigos en el gdf de municipios si existen
-        if 'CPRO' in muni_gdf.columns:
-            muni_gdf['CPRO'] = muni_gdf['CPRO'].astype(str).str.zfill(2)
-        if 'CMUN' in muni_gdf.columns:
-            muni_gdf['CMUN'] = muni_gdf['CMUN'].astype(str).str.zfill(3)
+        # Código empaquetado en el gdf de municipios
+        muni_gdf['CODMUN'] = pack_code(muni_gdf['CPRO'], muni_gdf['CMUN'])
 
-        # Merge geometries with our candidatos by CPRO+CMUN to get geometry for each candidate
+        # Merge geometries with our candidatos by CODMUN to get geometry for each candidate
         candidatos_geo = municipios_candidatos.merge(
-            muni_gdf[['CPRO','CMUN','geometry']],
-            on=['CPRO','CMUN'],
+            muni_gdf[['CODMUN','geometry']],
+            on='CODMUN',
             how='left'
         )
 
@@ -311,8 +315,8 @@ if not poblacion.empty:
 
         # Merge dist back into municipios_priorizados (mejores)
         merged_scores = mejores.merge(
-            joined[['CPRO','CMUN','dist_m','dist_km','dist_score']],
-            on=['CPRO','CMUN'],
+            joined[['CODMUN','dist_m','dist_km','dist_score']],
+            on='CODMUN',
             how='left'
         )
 
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import numpy as np
 import pandas as pd
@@ -9,6 +10,10 @@ import branca
 from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
 
+# Lectura con caché columnar (parte_2/codigoboost/csv_cache.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parte_2', 'codigoboost'))
+from schema import load_compact, pack_code
+
 BASE_DIR = os.path.dirname(__file__)
 # Detecta automáticamente el CSV disponible para facilitar la demo
 import glob
@@ -26,9 +31,8 @@ def load_csv(path: str) -> pd.DataFrame:
     if not os.path.exists(path):
         st.error(f'No se encontró el CSV: {path}')
         st.stop()
-    df = pd.read_csv(path, dtype={'CPRO': str, 'CMUN': str})
-    df['CPRO'] = df['CPRO'].str.zfill(2)
-    df['CMUN'] = df['CMUN'].str.zfill(3)
+    # Esquema compacto: código CODMUN int32, PROVINCIA categórica, población int32
+    df = load_compact(path)
     # armonizar nombres
     if 'Poblacion_2026' in df.columns and 'Poblacion' not in df.columns:
         df = df.rename(columns={'Poblacion_2026':'Poblacion'})
@@ -51,8 +55,7 @@ def load_shapes(path: str) -> gpd.GeoDataFrame | None:
         return None
     try:
         g = gpd.read_file(path)
-        g['CPRO'] = g['CPRO'].astype(str).str.zfill(2)
-        g['CMUN'] = g['CMUN'].astype(str).str.zfill(3)
+        g['CODMUN'] = pack_code(g['CPRO'], g['CMUN'])
         try:
             if g.crs is None or '4326' not in str(g.crs):
                 g = g.to_crs(epsg=4326)
@@ -106,15 +109,15 @@ if norm and weights.sum() > 0:
 has_coords = ('lat' in cdf.columns) and ('lon' in cdf.columns) and cdf['lat'].notna().any() and cdf['lon'].notna().any()
 merged = None
 if has_coords:
-    merged = cdf[['CPRO','CMUN','NOMBRE','PROVINCIA','pop_score','renta_score','alquiler_score','competition_score','lat','lon']].dropna(subset=['lat','lon']).copy()
+    merged = cdf[['CODMUN','NOMBRE','PROVINCIA','pop_score','renta_score','alquiler_score','competition_score','lat','lon']].dropna(subset=['lat','lon']).copy()
 else:
     shapes = load_shapes(SHAPE_FILE)
     if shapes is None:
         st.error('No se encontró shapefile y el CSV no tiene columnas lat/lon. Añade columnas lat y lon al CSV o sube el shapefile para continuar.')
         st.stop()
     merged = shapes.merge(
-        cdf[['CPRO','CMUN','NOMBRE','PROVINCIA','pop_score','renta_score','alquiler_score','competition_score']],
-        on=['CPRO','CMUN'], how='inner'
+        cdf[['CODMUN','NOMBRE','PROVINCIA','pop_score','renta_score','alquiler_score','competition_score']],
+        on='CODMUN', how='inner'
     )
 
 # score dinámico (multiplicado x1000 para valores grandes)
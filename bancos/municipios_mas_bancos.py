@@ -1,9 +1,14 @@
-import pandas as pd
+import os
+import sys
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+# Lectura con caché columnar (parte_2/codigoboost/csv_cache.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parte_2', 'codigoboost'))
+from csv_cache import read_csv_cached
+
 # Leer CSV
-df = pd.read_csv('bancos_por_municipio.csv')  # reemplaza con tu ruta
+df = read_csv_cached('bancos_por_municipio.csv', columns=['NMUN', 'num_bancos'])  # reemplaza con tu ruta
 
 # Seleccionar top 15 municipios con más bancos
 top_10 = df.sort_values('num_bancos', ascending=False).head(15)
@@ -0,0 +1,112 @@
+"""
+Hyperparameter search for the bank-count XGBoost model of predictcompare.py.
+Successive halving: many random configurations are scored with few boosting
+rounds, and only the best third advance to a rung with three times as many
+rounds. Folds are grouped by PROVINCIA so a province is never both in train
+and validation. Trees use the histogram method and every fit stops early on its
+validation fold. Fits run in parallel on all cores.
+
+The winning configuration is written to bancos_xgb_params.json, which
+predictcompare.py loads by default.
+"""
+import os
+import json
+import time
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.model_selection import GroupKFold
+from xgboost import XGBRegressor
+
+PARAMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bancos_xgb_params.json')
+
+# Fixed for every fit: histogram trees, one thread per fit (the search parallelises across fits)
+BASE_PARAMS = dict(tree_method='hist', random_state=42, n_jobs=1)
+
+SEARCH_SPACE = {
+    'learning_rate': [0.02, 0.05, 0.1, 0.2],
+    'max_depth': [3, 4, 5, 6, 8],
+    'min_child_weight': [1, 3, 5, 10],
+    'subsample': [0.7, 0.8, 0.9, 1.0],
+    'colsample_bytree': [0.5, 0.75, 1.0],
+    'reg_lambda': [0.1, 1.0, 10.0],
+}
+
+
+def sample_configs(n, seed=42):
+    """n distinct random configurations from SEARCH_SPACE."""
+    rng = np.random.default_rng(seed)
+    configs, seen = [], set()
+    n_total = int(np.prod([len(v) for v in SEARCH_SPACE.values()]))
+    while len(configs) < min(n, n_total):
+        cfg = {k: v[rng.integers(len(v))] for k, v in SEARCH_SPACE.items()}
+        key = tuple(sorted(cfg.items()))
+        if key not in seen:
+            seen.add(key)
+            configs.append({k: (v.item() if hasattr(v, 'item') else v) for k, v in cfg.items()})
+    return configs
+
+
+def _fit_fold(config, X, y, train_idx, val_idx, n_rounds, early_stopping):
+    """Validation MAE and best number of rounds of one config on one fold."""
+    model = XGBRegressor(**BASE_PARAMS, **config, n_estimators=n_rounds,
+                         early_stopping_rounds=early_stopping, eval_metric='mae')
+    model.fit(X[train_idx], y[train_idx], eval_set=[(X[val_idx], y[val_idx])], verbose=False)
+    pred = model.predict(X[val_idx], iteration_range=(0, model.best_iteration + 1))
+    return float(np.mean(np.abs(pred - y[val_idx]))), model.best_iteration + 1
+
+
+def successive_halving(X, y, groups, n_candidates=27, eta=3, min_rounds=50, max_rounds=2000,
+                       n_splits=5, early_stopping=30, n_jobs=-1, seed=42, verbose=True):
+    """Run the search and return the best configuration with its CV scores.
+
+    The result dict has 'params' (ready for XGBRegressor, including
+    n_estimators), 'cv_mae', 'cv_mae_std' and the per-rung 'history'.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n_splits = min(n_splits, len(np.unique(groups)))
+    folds = list(GroupKFold(n_splits=n_splits).split(X, y, groups))
+
+    candidates = sample_configs(n_candidates, seed)
+    n_rounds = min_rounds
+    history = []
+    with Parallel(n_jobs=n_jobs) as parallel:
+        while True:
+            t0 = time.perf_counter()
+            out = parallel(delayed(_fit_fold)(cfg, X, y, tr, va, n_rounds, early_stopping)
+                           for cfg in candidates for tr, va in folds)
+            maes = np.array([o[0] for o in out]).reshape(len(candidates), n_splits)
+            best_it = np.array([o[1] for o in out]).reshape(len(candidates), n_splits)
+            scores = maes.mean(axis=1)
+            order = np.argsort(scores, kind='stable')
+            history.append({'rounds': n_rounds, 'n_candidates': len(candidates),
+                            'best_cv_mae': float(scores[order[0]]),
+                            'seconds': round(time.perf_counter() - t0, 2)})
+            if verbose:
+                print(f"  rung {len(history)}: {len(candidates)} configuraciones x {n_splits} folds, "
+                      f"{n_rounds} rounds -> best MAE {scores[order[0]]:.3f} "
+                      f"({history[-1]['seconds']} s)")
+            keep = len(candidates) // eta
+            if keep <= 1 or n_rounds >= max_rounds:
+                break
+            candidates = [candidates[i] for i in order[:keep]]
+            n_rounds = min(n_rounds * eta, max_rounds)
+
+    i = order[0]
+    params = dict(candidates[i], n_estimators=int(np.median(best_it[i])), tree_method='hist',
+                  random_state=BASE_PARAMS['random_state'])
+    return {'params': params, 'cv_mae': float(scores[i]), 'cv_mae_std': float(maes[i].std()),
+            'n_splits': n_splits, 'history': history}
+
+
+def save_params(result, path=PARAMS_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+
+
+def load_params(default, path=PARAMS_PATH):
+    """Tuned XGBRegressor parameters from `path`, or `default` if not tuned yet."""
+    if not os.path.exists(path):
+        return dict(default)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['params']
@@ -1,7 +1,15 @@
+import os
+import sys
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 
+# Lectura con caché columnar (parte_2/codigoboost/csv_cache.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parte_2', 'codigoboost'))
+from csv_cache import read_csv_cached
+from schema import load_compact
+from muni_index import attach_codes
+
 # Leer el archivo CSV
 df = pd.read_csv(r'C:\Users\emmah\OneDrive\Escritorio\UNI\TERCER\DataCoop25\alquiler\alquiler_municipio.csv', encoding='utf-8')
 
@@ -109,7 +117,7 @@ with col2:
 # ----------------------- GRAFICAS RENTA -----------------------
 
 # Leer el archivo CSV de renta
-df_renta = pd.read_csv(r"C:\Users\emmah\OneDrive\Escritorio\UNI\TERCER\DataCoop25\10RENTAS\RentaMedia_limpio.csv", sep=',', encoding='utf-8')
+df_renta = read_csv_cached(r"C:\Users\emmah\OneDrive\Escritorio\UNI\TERCER\DataCoop25\10RENTAS\RentaMedia_limpio.csv")
 
 # Ordenar los datos de manera descendente por la columna 'Total' y seleccionar los primeros 10
 df_renta_top10 = df_renta.sort_values(by='Total', ascending=False).head(10)
@@ -331,25 +339,32 @@ st.markdown("""
 import plotly.graph_objects as go
 
 # Cargar los archivos CSV
-df_2026 = pd.read_csv(r"C:\Users\emmah\OneDrive\Escritorio\UNI\TERCER\DataCoop25\parte_2\predecir2026\municipios_priorizados_2026.csv")
-df_poblacion = pd.read_csv(r"C:\Users\emmah\OneDrive\Escritorio\UNI\TERCER\DataCoop25\parte_2\datosfuturos\municipios_predicciones.csv")
-df_renta = pd.read_csv(r"C:\Users\emmah\OneDrive\Escritorio\UNI\TERCER\DataCoop25\parte_2\datosfuturos\prediccion_renta.csv")
+anios = [str(a) for a in [2015, 2016, 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2026, 2028, 2030]]
+# Solo las columnas que usan las gráficas
+df_2026 = load_compact(r"C:\Users\emmah\OneDrive\Escritorio\UNI\TERCER\DataCoop25\parte_2\predecir2026\municipios_priorizados_2026.csv",
+                       columns=['CPRO', 'CMUN', 'NOMBRE', 'PROVINCIA', 'score_total'])
+df_poblacion = read_csv_cached(r"C:\Users\emmah\OneDrive\Escritorio\UNI\TERCER\DataCoop25\parte_2\datosfuturos\municipios_predicciones.csv",
+                               columns=['Municipios'] + anios)
+# Nombre -> CODMUN una sola vez; las filas de cada municipio se buscan por código
+df_poblacion = attach_codes(df_poblacion, 'Municipios', population_col='2023', label='municipios_predicciones.csv')
+df_poblacion = df_poblacion.set_index('CODMUN')
+df_renta = read_csv_cached(r"C:\Users\emmah\OneDrive\Escritorio\UNI\TERCER\DataCoop25\parte_2\datosfuturos\prediccion_renta.csv",
+                           columns=['Provincias'] + anios)
 
 # Seleccionar los 10 municipios con mayor score en 2026
 top_municipios = df_2026.sort_values(by="score_total", ascending=False).head(10)
 nombres = top_municipios["NOMBRE"].tolist()
 provincias = top_municipios["PROVINCIA"].tolist()
-anios = [str(a) for a in [2015, 2016, 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2026, 2028, 2030]]
 
 # Gráfica de población
 fig1 = go.Figure()
 
-for municipio in nombres:
-    fila = df_poblacion[df_poblacion["Municipios"] == municipio]
-    if not fila.empty:
+filas = df_poblacion.reindex(top_municipios['CODMUN'])
+for municipio, (_, fila) in zip(nombres, filas.iterrows()):
+    if fila[anios].notna().any():
         fig1.add_trace(go.Scatter(
             x=anios,
-            y=fila.iloc[0][anios],
+            y=fila[anios],
             mode='lines+markers',
             name=municipio
         ))
@@ -0,0 +1,77 @@
+"""
+Multi-horizon bank deficit scoring.
+Stacks the (population, income) features of every horizon into one long matrix,
+scores all of them with a single model.predict call and returns a tidy table
+(municipality, year, predicted_banks, deficit) that plots and dashboards can
+use directly. Top-k selection uses argpartition instead of full sorts.
+"""
+import numpy as np
+import pandas as pd
+
+
+def horizon_columns(df, years):
+    """Population (POByy) and income (yyyy) column names for each horizon."""
+    cols = {}
+    for year in years:
+        cp, cr = f'POB{str(year)[-2:]}', str(year)
+        if cp not in df.columns:
+            raise ValueError(f"Falta columna {cp} para el año {year}.")
+        if cr not in df.columns:
+            raise ValueError(f"Falta columna de renta '{cr}' para el año {year}.")
+        cols[year] = (cp, cr)
+    return cols
+
+
+def horizon_features(df, years):
+    """Long feature matrix with all horizons stacked year after year.
+
+    Returns a DataFrame with columns ['poblacion', 'renta'] of length
+    len(df) * len(years); row j * len(df) + i is municipality i at years[j].
+    """
+    cols = horizon_columns(df, years)
+    pob = df[[cols[y][0] for y in years]].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    renta = df[[cols[y][1] for y in years]].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    # (municipios x años) -> columna larga en orden año-major
+    return pd.DataFrame({'poblacion': pob.T.ravel(), 'renta': renta.T.ravel()})
+
+
+def deficit_table(model, df, years, muni_col='NOMBRE', bancos_col='num_bancos'):
+    """Predicted banks and deficit of every municipality at every horizon.
+
+    deficit = current banks - predicted banks, so negative values are
+    municipalities with fewer branches than the model expects.
+    """
+    years = list(years)
+    n = len(df)
+    preds = np.round(model.predict(horizon_features(df, years)), 2)
+    bancos = np.tile(pd.to_numeric(df[bancos_col], errors='coerce').to_numpy(dtype=float), len(years))
+
+    table = pd.DataFrame({
+        'municipality': np.tile(df[muni_col].astype(str).to_numpy(), len(years)),
+        'year': np.repeat(years, n),
+        'num_bancos': bancos,
+        'predicted_banks': preds,
+        'deficit': bancos - preds,
+    })
+    if 'PROVINCIA' in df.columns:
+        table.insert(1, 'PROVINCIA', np.tile(df['PROVINCIA'].to_numpy(), len(years)))
+    return table
+
+
+def top_deficit(table, k=10):
+    """The k largest deficits (most negative) per year, sorted within each year."""
+    parts = []
+    for _, group in table.groupby('year', sort=False):
+        d = group['deficit'].to_numpy()
+        # NaN al final para que no entren en el top
+        d = np.where(np.isnan(d), np.inf, d)
+        if k < len(d):
+            # Candidatos: todo lo que no supera el k-ésimo valor (incluye empates)
+            kth = np.partition(d, k - 1)[k - 1]
+            idx = np.flatnonzero(d <= kth)
+        else:
+            idx = np.arange(len(d))
+        # Orden estable por (déficit, posición), igual que un sort_values estable
+        idx = idx[np.lexsort((idx, d[idx]))][:k]
+        parts.append(group.iloc[idx])
+    return pd.concat(parts, ignore_index=True)
@@ -0,0 +1,246 @@
+"""
+Rolling-origin backtest of every forecaster.
+Each model is refitted on the data up to each origin year (2019, 2020, 2021 by
+default) and scored on the years after it. (model, origin, chunk of series)
+fits run in a process pool, and each fitted model is stored in the model
+registry as backtest_<model>_<origin>, keyed by a hash of the model code and
+the training window. Later runs forecast from the stored models, so only the
+origins whose data or code changed are refitted, whatever the horizons.
+Writes a compact MAPE/MAE table per model and horizon.
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor
+from forecast_cache import code_version, cache_key
+from model_registry import ModelRegistry
+from ine_csv import read_ine_csv
+from trend_engine import fit_trends, predict_trends
+from model_tournament import HOLT_GRID, last_growth_forecast
+from exp_smoothing import fit_holt, holt_forecast, holt_sse
+from predict_trends_gboost import (WORKDIR, REGISTRY_DIR, GBR_PARAMS, GLOBAL_FIT_ROWS, FEATURE_COLS, STATE_COLS,
+                                   local_features, recursive_forecast, _safe_growth, panel_features,
+                                   _series_panel, _with_descriptors, fit_global_model, forecast_global)
+
+ORIGINS = [2019, 2020, 2021]
+# Per-series GBoost costs ~0.25 s per fit: evaluated on an evenly spaced subset
+LOCAL_MAX_SERIES = 200
+CHUNK_SIZE = 50
+# The input CSVs live in parte_2/, one level above this script
+DATA_DIR = os.path.normpath(os.path.join(WORKDIR, '..'))
+
+# name -> (file, id column, prefix of the year columns)
+DATASETS = {
+    'poblacion': ('poblacion_municipios_2015_2023.csv', 'Municipios', ''),
+    'renta': ('renta_provincias_2015_2023.csv', 'Provincias', ''),
+    'alquiler': ('alquiler_precios_unido_imputed.csv', 'Localización', 'Precio_'),
+}
+
+
+def load_panel(name, path=None):
+    """(ids, years, values) of a wide dataset; values is (n_series, n_years)."""
+    fname, id_col, prefix = DATASETS[name]
+    df = read_ine_csv(path or os.path.join(DATA_DIR, fname))
+    cols = [c for c in df.columns if c.startswith(prefix) and c[len(prefix):].isdigit()]
+    years = np.array([int(c[len(prefix):]) for c in cols])
+    order = np.argsort(years)
+    return df[id_col].astype(str).to_numpy(), years[order], df[[cols[i] for i in order]].to_numpy(dtype=float)
+
+
+# Each forecaster is split into fit(years, Y) -> model and
+# forecast(model, years, target_years) -> (n, len(target_years)), so a stored
+# model serves any horizon
+def _linear_fit(years, Y):
+    return fit_trends(years, Y)
+
+
+def _linear_forecast(coefs, years, target_years):
+    return predict_trends(coefs, target_years)
+
+
+def _damped_holt_fit(years, Y):
+    return fit_holt(Y, grid=HOLT_GRID)
+
+
+def _holt_fit(years, Y):
+    return fit_holt(Y)
+
+
+def _holt_forecast(fit, years, target_years):
+    return holt_forecast(fit, np.asarray(target_years, dtype=float) - years[-1])
+
+
+def _last_growth_fit(years, Y):
+    return Y[:, -2:]
+
+
+def _last_growth_forecast(last, years, target_years):
+    return last_growth_forecast(years, last, target_years)
+
+
+def _gboost_global_fit(years, Y):
+    return fit_global_model([(list(years), vals) for vals in Y], GLOBAL_FIT_ROWS)
+
+
+def _gboost_global_forecast(fitted, years, target_years):
+    results = forecast_global(*fitted, target_years)
+    return np.array([[preds[t] for t in target_years] for preds, _, _ in results])
+
+
+def _gboost_local_fit(years, Y):
+    """One GBoost per series, fitted on all its rows as in train_and_predict (without the CV)."""
+    fitted = []
+    for feats in local_features([(years, vals) for vals in Y]):
+        model = GradientBoostingRegressor(**GBR_PARAMS).fit(feats[FEATURE_COLS].values, feats['value'].values)
+        fitted.append((model, feats[STATE_COLS].values[-1:]))
+    return fitted
+
+
+def _gboost_local_forecast(fitted, years, target_years):
+    out = np.full((len(fitted), len(target_years)), np.nan)
+    for i, (model, last) in enumerate(fitted):
+        preds = recursive_forecast(model.predict, last, min(years), max(years), target_years)
+        out[i] = [preds[t][0] for t in target_years]
+    return out
+
+
+# name -> (fit, forecast, per-series)
+# Per-series models are split into chunks across the pool; the rest run as one task per origin.
+FORECASTERS = {
+    'linear': (_linear_fit, _linear_forecast, False),
+    'damped_holt': (_damped_holt_fit, _holt_forecast, False),
+    'last_growth': (_last_growth_fit, _last_growth_forecast, False),
+    'holt': (_holt_fit, _holt_forecast, False),
+    'gboost_global': (_gboost_global_fit, _gboost_global_forecast, False),
+    'gboost_local': (_gboost_local_fit, _gboost_local_forecast, True),
+}
+
+# Model code behind each forecaster, hashed into the registry key with the wrappers,
+# so editing a model invalidates its stored backtest fits
+_HOLT_CODE = (fit_holt, holt_forecast, holt_sse)
+_GBOOST_CODE = (recursive_forecast, _safe_growth)
+MODEL_CODE = {
+    'linear': (fit_trends, predict_trends),
+    'damped_holt': _HOLT_CODE,
+    'last_growth': (last_growth_forecast,),
+    'holt': _HOLT_CODE,
+    'gboost_global': (fit_global_model, forecast_global, panel_features, _series_panel,
+                      _with_descriptors) + _GBOOST_CODE,
+    'gboost_local': (local_features, panel_features) + _GBOOST_CODE,
+}
+
+
+def _fit_task(name, years, Y):
+    """Fitted model of the series without gaps in the window ({'ok': mask, 'model': ...})."""
+    fit, _, _ = FORECASTERS[name]
+    ok = ~np.isnan(Y).any(axis=1)
+    return {'ok': ok, 'model': fit(years, Y[ok]) if ok.any() else None}
+
+
+def _forecast_task(name, fitted, years, target_years):
+    """Forecasts of a _fit_task result; series left out of the fit get NaN."""
+    _, forecast, _ = FORECASTERS[name]
+    out = np.full((len(fitted['ok']), len(target_years)), np.nan)
+    if fitted['model'] is not None:
+        out[fitted['ok']] = forecast(fitted['model'], years, target_years)
+    return out
+
+
+def backtest(years, Y, models=None, origins=ORIGINS, workers=1, cache=True, local_max_series=LOCAL_MAX_SERIES):
+    """Forecasts of every model from every origin, scored against the actuals.
+
+    Returns a long frame (model, origin, horizon, series, actual, forecast).
+    """
+    models = models or list(FORECASTERS)
+    tasks = []
+    for origin in origins:
+        train = years <= origin
+        target_years = [int(y) for y in years[~train]]
+        if train.sum() < 3 or not target_years:
+            continue
+        for name in models:
+            fit, forecast, per_series = FORECASTERS[name]
+            rows = np.arange(len(Y))
+            if name == 'gboost_local' and len(rows) > local_max_series:
+                rows = np.unique(np.linspace(0, len(Y) - 1, local_max_series).astype(int))
+            chunks = [rows[i:i + CHUNK_SIZE] for i in range(0, len(rows), CHUNK_SIZE)] if per_series else [rows]
+            version = code_version(fit, forecast, _fit_task, _forecast_task, *MODEL_CODE.get(name, ()))
+            for chunk in chunks:
+                # The target years are not part of the key: the stored model serves any horizon
+                key = cache_key('backtest', name, version, GBR_PARAMS, HOLT_GRID, GLOBAL_FIT_ROWS, origin,
+                                years[train], Y[chunk][:, train])
+                tasks.append((name, origin, chunk, target_years, key))
+
+    registry = ModelRegistry(REGISTRY_DIR)
+    models = [registry.lookup(f'backtest_{t[0]}_{t[1]}', t[4]) if cache else None for t in tasks]
+    models = [None if entry is None else entry.model for entry in models]
+    todo = [i for i, m in enumerate(models) if m is None]
+    t0 = time.perf_counter()
+    args = [(tasks[i][0], years[years <= tasks[i][1]], Y[tasks[i][2]][:, years <= tasks[i][1]]) for i in todo]
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fitted = list(pool.map(_fit_task, *zip(*args)))
+    else:
+        fitted = [_fit_task(*a) for a in args]
+    for i, m in zip(todo, fitted):
+        models[i] = m
+        name, origin, chunk, _, key = tasks[i]
+        registry.save(f'backtest_{name}_{origin}', m, key, params=GBR_PARAMS if name.startswith('gboost') else None,
+                      metrics={'n_series': len(chunk), 'n_fitted': int(m['ok'].sum())})
+    print(f'  {len(tasks)} fits: {len(tasks) - len(todo)} from the model registry, {len(todo)} fitted '
+          f'in {time.perf_counter() - t0:.1f}s')
+
+    frames = []
+    for (name, origin, chunk, target_years, _), fitted in zip(tasks, models):
+        preds = _forecast_task(name, fitted, years[years <= origin], target_years)
+        actual = Y[chunk][:, np.isin(years, target_years)]
+        frames.append(pd.DataFrame({
+            'model': name,
+            'origin': origin,
+            'horizon': np.tile(np.asarray(target_years) - origin, len(chunk)),
+            'series': np.repeat(chunk, len(target_years)),
+            'actual': actual.ravel(),
+            'forecast': preds.ravel(),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def accuracy_table(errors):
+    """MAPE, MAE and number of scored forecasts per model and horizon."""
+    e = errors.dropna(subset=['actual', 'forecast'])
+    e = e.assign(abs_err=(e['forecast'] - e['actual']).abs())
+    e = e.assign(ape=e['abs_err'] / e['actual'].abs().where(e['actual'] != 0))
+    table = e.groupby(['model', 'horizon']).agg(mape=('ape', 'mean'), mae=('abs_err', 'mean'),
+                                                n=('abs_err', 'size')).reset_index()
+    return table.sort_values(['horizon', 'mape'], ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rolling-origin backtest of the forecasters.')
+    parser.add_argument('dataset', choices=list(DATASETS))
+    parser.add_argument('--input', help='path of the dataset (default: parte_2/<file>)')
+    parser.add_argument('--models', nargs='+', choices=list(FORECASTERS), help='models to evaluate (default: all)')
+    parser.add_argument('--origins', type=int, nargs='+', default=ORIGINS, help='last training year of each replay')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes (1 = serial)')
+    parser.add_argument('--local-max-series', type=int, default=LOCAL_MAX_SERIES,
+                        help='series evaluated with per-series GBoost')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='refit every origin instead of reusing the registered models')
+    args = parser.parse_args()
+
+    path = args.input or os.path.join(DATA_DIR, DATASETS[args.dataset][0])
+    if not os.path.exists(path):
+        print(f'{args.dataset} file not found:', path)
+        sys.exit(1)
+    ids, years, Y = load_panel(args.dataset, path)
+    print(f'{args.dataset}: {len(ids)} series x {len(years)} years, origins {args.origins}')
+    errors = backtest(years, Y, args.models, args.origins, args.workers, args.cache, args.local_max_series)
+    table = accuracy_table(errors)
+    print(table.to_string(index=False))
+    out_path = os.path.join(WORKDIR, f'backtest_{args.dataset}.csv')
+    table.to_csv(out_path, index=False)
+    print('Saved', out_path)
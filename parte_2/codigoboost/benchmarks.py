@@ -0,0 +1,215 @@
+"""
+Benchmark suite for the forecasting entry points.
+Generates synthetic panels (default 50, 8,100 and 80,000 series x 9 and 30
+years), times every entry point on each panel, records peak memory and writes
+the results to a JSON baseline. `compare` reruns the same cases and flags any
+entry that got more than 10% slower or heavier than the baseline.
+
+  python benchmarks.py run                      # writes benchmarks_baseline.json
+  python benchmarks.py compare                  # exit code 1 on regression
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+import sklearn
+from trend_engine import fit_trends, predict_trends, trend_stats, update_stats, bootstrap_intervals
+from predict_trends_gboost import (WORKDIR, TARGET_YEARS, create_features, panel_features,
+                                   train_and_predict, train_and_predict_global)
+
+BASELINE_PATH = os.path.join(WORKDIR, 'benchmarks_baseline.json')
+SIZES = [50, 8100, 80000]
+YEAR_SPANS = [9, 30]
+THRESHOLD = 0.10
+# Timings and peaks below these are dominated by noise and never flagged
+MIN_SECONDS = 0.01
+MIN_MB = 1.0
+
+
+def synthetic_panel(n_series, n_years, seed=0):
+    """Positive series with log-normal levels, per-series trend and noise.
+
+    Returns (years, values) with values of shape (n_series, n_years), ending in
+    2023 like the INE panels.
+    """
+    rng = np.random.default_rng(seed)
+    years = np.arange(2024 - n_years, 2024)
+    level = np.exp(rng.normal(7, 1.5, size=(n_series, 1)))
+    growth = rng.normal(0, 0.01, size=(n_series, 1))
+    noise = rng.normal(0, 0.02, size=(n_series, n_years))
+    values = level * np.exp(growth * np.arange(n_years) + noise)
+    return years, np.round(values, 1)
+
+
+def _bench_fit_trends(years, values):
+    predict_trends(fit_trends(years, values), TARGET_YEARS)
+
+
+def _bench_trend_update(years, values):
+    stats = trend_stats(years[:-1], values[:, :-1])
+    update_stats(stats, years[-1], values[:, -1])
+
+
+def _bench_bootstrap(years, values):
+    bootstrap_intervals(years, values, TARGET_YEARS)
+
+
+def _bench_create_features(years, values):
+    for vals in values:
+        create_features(years, vals)
+
+
+def _bench_panel_features(years, values):
+    panel_features(values, years)
+
+
+def _bench_train_and_predict(years, values):
+    for vals in values:
+        train_and_predict(years, vals, TARGET_YEARS)
+
+
+def _bench_global(years, values):
+    train_and_predict_global([(years, vals) for vals in values], TARGET_YEARS)
+
+
+# name -> (function, max series timed by default; None = whole panel).
+# The per-series loops are capped so the suite finishes in minutes; --full lifts the caps.
+BENCHMARKS = {
+    'fit_trends': (_bench_fit_trends, None),
+    'trend_update': (_bench_trend_update, None),
+    'bootstrap_intervals': (_bench_bootstrap, None),
+    'create_features': (_bench_create_features, 200),
+    'panel_features': (_bench_panel_features, None),
+    'train_and_predict': (_bench_train_and_predict, 20),
+    'train_and_predict_global': (_bench_global, 2000),
+}
+
+
+def _measure(func, years, values, repeat):
+    """Best wall time over `repeat` runs, then peak traced memory in one more run."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(years, values)
+        times.append(time.perf_counter() - t0)
+        # Slow cases are not worth repeating
+        if times[-1] > 1.0:
+            break
+    # Timed and memory-traced in separate passes: tracemalloc slows pandas down
+    tracemalloc.start()
+    func(years, values)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 2**20
+
+
+def run_suite(sizes=SIZES, year_spans=YEAR_SPANS, only=None, full=False, repeat=3):
+    """Run every (benchmark, size, years) case; returns the list of result dicts."""
+    results = []
+    for n_years in year_spans:
+        for n_series in sizes:
+            years, values = synthetic_panel(n_series, n_years)
+            for name, (func, cap) in BENCHMARKS.items():
+                if only and name not in only:
+                    continue
+                n_run = n_series if full or cap is None else min(n_series, cap)
+                seconds, peak_mb = _measure(func, years, values[:n_run], repeat)
+                results.append({'name': name, 'n_series': n_series, 'n_years': n_years,
+                                'n_run': n_run, 'seconds': round(seconds, 5),
+                                'peak_mb': round(peak_mb, 2)})
+                print(f"{name:<26} {n_series:>6} x {n_years:<2} (ran {n_run:>6})  "
+                      f"{seconds:9.4f}s  {peak_mb:9.1f} MB")
+    return results
+
+
+def environment():
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'sklearn': sklearn.__version__, 'created': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def compare(baseline, current, threshold=THRESHOLD, min_seconds=MIN_SECONDS, min_mb=MIN_MB):
+    """Rows of current vs baseline per case, with a 'regression' flag.
+
+    A case regresses if its time or peak memory grew by more than `threshold`
+    (only when above `min_seconds` / `min_mb`). Cases missing from either side
+    are ignored.
+    """
+    key = lambda r: (r['name'], r['n_series'], r['n_years'], r['n_run'])
+    base = {key(r): r for r in baseline['results']}
+    rows = []
+    for r in current['results']:
+        b = base.get(key(r))
+        if b is None:
+            continue
+        time_ratio = r['seconds'] / b['seconds'] if b['seconds'] > 0 else np.nan
+        mem_ratio = r['peak_mb'] / b['peak_mb'] if b['peak_mb'] > 0 else np.nan
+        slow = time_ratio > 1 + threshold and max(r['seconds'], b['seconds']) >= min_seconds
+        heavy = mem_ratio > 1 + threshold and max(r['peak_mb'], b['peak_mb']) >= min_mb
+        rows.append({'name': r['name'], 'n_series': r['n_series'], 'n_years': r['n_years'],
+                     'seconds_base': b['seconds'], 'seconds': r['seconds'], 'time_ratio': round(time_ratio, 3),
+                     'peak_mb_base': b['peak_mb'], 'peak_mb': r['peak_mb'], 'mem_ratio': round(mem_ratio, 3),
+                     'regression': bool(slow or heavy)})
+    return pd.DataFrame(rows)
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save(path, report):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print('Saved', path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark suite for the forecasting entry points.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_p = sub.add_parser('run', help='run the suite and write a JSON baseline')
+    run_p.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='numbers of series')
+    run_p.add_argument('--years', type=int, nargs='+', default=YEAR_SPANS, help='years per series')
+    run_p.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='subset of benchmarks')
+    run_p.add_argument('--full', action='store_true', help='time the per-series loops on every series')
+    run_p.add_argument('--output', default=BASELINE_PATH)
+
+    cmp_p = sub.add_parser('compare', help='rerun the baseline cases and flag regressions')
+    cmp_p.add_argument('--baseline', default=BASELINE_PATH)
+    cmp_p.add_argument('--current', help='compare an existing results file instead of rerunning')
+    cmp_p.add_argument('--threshold', type=float, default=THRESHOLD, help='allowed relative growth')
+    cmp_p.add_argument('--min-seconds', type=float, default=MIN_SECONDS,
+                       help='timings below this are not flagged')
+    cmp_p.add_argument('--min-mb', type=float, default=MIN_MB,
+                       help='peak memory below this is not flagged')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run_suite(args.sizes, args.years, args.only, args.full)
+        _save(args.output, {'environment': environment(),
+                            'config': {'sizes': args.sizes, 'years': args.years,
+                                       'only': args.only, 'full': args.full},
+                            'results': results})
+    else:
+        baseline = _load(args.baseline)
+        if args.current:
+            current = _load(args.current)
+        else:
+            cfg = baseline['config']
+            current = {'results': run_suite(cfg['sizes'], cfg['years'], cfg['only'], cfg['full'])}
+        table = compare(baseline, current, args.threshold, args.min_seconds, args.min_mb)
+        with pd.option_context('display.width', 200, 'display.max_rows', None):
+            print(table.to_string(index=False))
+        bad = table[table['regression']]
+        if len(bad):
+            print(f"\n{len(bad)} regression(s) above {args.threshold:.0%}:")
+            for r in bad.itertuples():
+                print(f"  {r.name} {r.n_series} x {r.n_years}: time x{r.time_ratio}, memory x{r.mem_ratio}")
+            sys.exit(1)
+        print(f"\nNo regressions above {args.threshold:.0%}")
@@ -0,0 +1,223 @@
+"""
+Cohort-component population projection (age x sex) for all municipalities at once.
+Input is the INE export "Población por sexo, municipios y edad (grupos
+quinquenales)" in long format (Municipios;Sexo;Edad;Periodo;Total), like
+evolucion_poblacion.csv with an extra Edad column.
+
+The population is a (municipality, sex, age band) tensor. Each year it is
+advanced by a Leslie-style transition per sex (survival, then 1/width of each
+band moves up one band, the last band is open), plus births from female
+fertility and net migration rates. Every step is one einsum over all
+municipalities.
+
+Migration rates come from the residual method when the input has several
+years, otherwise from the municipality's total growth in
+poblacion_municipios_2015_2023.csv (--totals), spread over a young-adult age
+profile. Output: poblacion_cohortes.csv with Codigo, Municipios and POBxx
+columns, compatible with the POB26-POB30 columns of poblacion_total_merged.csv.
+"""
+import os
+import re
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from ine_csv import read_ine_csv
+
+WORKDIR = os.path.dirname(os.path.abspath(__file__))
+TARGET_YEARS = [2026, 2027, 2028, 2029, 2030]
+SEXES = ['Hombres', 'Mujeres']
+MALE_BIRTHS = 0.515
+
+# Default rates by lower bound of each 5-year band (national approximation,
+# INE 2022); override with --rates (edad, sexo, mortalidad, fecundidad)
+MORTALITY = {
+    'Hombres': [0.0006, 0.0001, 0.0001, 0.0002, 0.0004, 0.0004, 0.0005, 0.0007, 0.0011, 0.0019, 0.0031,
+                0.0048, 0.0073, 0.011, 0.016, 0.026, 0.046, 0.085, 0.15, 0.25, 0.38],
+    'Mujeres': [0.0005, 0.0001, 0.0001, 0.0001, 0.0002, 0.0002, 0.0002, 0.0004, 0.0006, 0.0010, 0.0016,
+                0.0024, 0.0034, 0.0050, 0.0080, 0.014, 0.028, 0.058, 0.115, 0.20, 0.33],
+}
+FERTILITY = {15: 0.006, 20: 0.024, 25: 0.051, 30: 0.087, 35: 0.069, 40: 0.019, 45: 0.0015}
+# Relative weight of each band in net migration (young adults move the most)
+MIGRATION_PROFILE = {0: 0.6, 5: 0.4, 10: 0.3, 15: 0.7, 20: 1.6, 25: 2.0, 30: 1.7, 35: 1.2, 40: 0.9,
+                     45: 0.7, 50: 0.5, 55: 0.4, 60: 0.4, 65: 0.3, 70: 0.2}
+
+
+def parse_age(label):
+    """Lower bound of an INE age label ('De 5 a 9 años', '100 y más años'); None for 'Total'."""
+    m = re.search(r'\d+', str(label))
+    return int(m.group()) if m else None
+
+
+def load_age_table(path):
+    """Tensor of the INE age x sex export.
+
+    Returns (codes, names, years, bands, P) with P of shape
+    (n_munis, n_years, 2, n_bands); missing cells are 0.
+    """
+    df = read_ine_csv(path, numeric=['Total'], thousands='.',
+                      dtype={'Municipios': str, 'Sexo': str, 'Edad': str})
+    df = df[df['Sexo'].isin(SEXES)]
+    df['edad'] = df['Edad'].map(parse_age)
+    df = df[df['edad'].notna()]
+    split = df['Municipios'].str.split(' ', n=1)
+    df['Codigo'], df['Municipio'] = split.str[0], split.str[1]
+    # Only 5-digit INE municipality codes (drops national/province totals)
+    df = df[df['Codigo'].str.fullmatch(r'\d{5}', na=False)]
+    df['Total'] = df['Total'].fillna(0)
+
+    codes, m_idx = np.unique(df['Codigo'], return_inverse=True)
+    years, y_idx = np.unique(df['Periodo'].astype(int), return_inverse=True)
+    bands, b_idx = np.unique(df['edad'].astype(int), return_inverse=True)
+    s_idx = df['Sexo'].map({s: i for i, s in enumerate(SEXES)}).to_numpy()
+    P = np.zeros((len(codes), len(years), 2, len(bands)))
+    np.add.at(P, (m_idx, y_idx, s_idx, b_idx), df['Total'].to_numpy())
+    names = df.drop_duplicates('Codigo').set_index('Codigo').loc[codes, 'Municipio'].to_numpy()
+    return codes, names, years, bands, P
+
+
+def default_rates(bands, rates_path=None):
+    """(mortality (2, B), fertility (B,)) for the given band lower bounds."""
+    idx = np.minimum(bands // 5, 20)
+    mortality = np.array([np.asarray(MORTALITY[s])[idx] for s in SEXES])
+    fertility = np.array([FERTILITY.get(int(b), 0.0) for b in bands])
+    if rates_path:
+        r = read_ine_csv(rates_path)
+        for i, s in enumerate(SEXES):
+            sub = r[r['sexo'] == s].set_index('edad')
+            mortality[i] = sub['mortalidad'].reindex(bands).fillna(pd.Series(mortality[i], index=bands)).to_numpy()
+            if s == 'Mujeres':
+                fertility = sub['fecundidad'].reindex(bands).fillna(0).to_numpy()
+    return mortality, fertility
+
+
+def transition_matrices(bands, mortality):
+    """(2, B, B) Leslie-style matrices without births: L[s] @ p advances one year.
+
+    A band of width w loses 1/w of its survivors to the next band; the last
+    band is open and keeps its survivors.
+    """
+    B = len(bands)
+    width = np.append(np.diff(bands), np.inf).astype(float)
+    up = 1.0 / width
+    L = np.zeros((2, B, B))
+    surv = 1 - mortality
+    rows = np.arange(B)
+    L[:, rows, rows] = surv * (1 - up)
+    L[:, rows[1:], rows[:-1]] = surv[:, :-1] * up[:-1]
+    return L
+
+
+def step(P, L, fertility, migration):
+    """One-year projection of P (n, 2, B): ageing, births and net migration."""
+    births = P[:, 1] @ fertility
+    out = np.einsum('sij,nsj->nsi', L, P)
+    out[:, 0, 0] += births * MALE_BIRTHS
+    out[:, 1, 0] += births * (1 - MALE_BIRTHS)
+    out += P * migration
+    return np.maximum(out, 0)
+
+
+def residual_migration(P_hist, years, L, fertility):
+    """Net migration rates (n, 2, B) from the observed years (residual method).
+
+    Observed minus projected-without-migration population, per year of each
+    interval, over the starting population; pooled over all intervals.
+    """
+    num = np.zeros(P_hist.shape[:1] + P_hist.shape[2:])
+    den = np.zeros_like(num)
+    no_mig = np.zeros_like(num)
+    for t in range(len(years) - 1):
+        gap = int(years[t + 1] - years[t])
+        P = P_hist[:, t]
+        for _ in range(gap):
+            P = step(P, L, fertility, no_mig)
+        num += (P_hist[:, t + 1] - P) / gap
+        den += P_hist[:, t]
+    return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+
+def growth_migration(P, bands, L, fertility, growth):
+    """Net migration rates (n, 2, B) that reproduce an observed total growth rate per municipality.
+
+    The gap between the observed growth and the natural growth is spread over
+    bands with MIGRATION_PROFILE.
+    """
+    natural = step(P, L, fertility, np.zeros_like(P)).sum(axis=(1, 2))
+    total = P.sum(axis=(1, 2))
+    gap = total * (1 + growth) - natural
+    profile = np.array([MIGRATION_PROFILE.get(int(b), 0.1) for b in bands])
+    weight = P * profile
+    norm = weight.sum(axis=(1, 2))
+    scale = np.divide(gap, norm, out=np.zeros_like(gap), where=norm > 0)
+    return profile * scale[:, None, None] * np.ones_like(P)
+
+
+def total_growth(names, totals_path, window=5):
+    """Mean annual growth over the last `window` years of poblacion_municipios_2015_2023.csv per name."""
+    df = read_ine_csv(totals_path).set_index('Municipios')
+    year_cols = sorted((c for c in df.columns if c.isdigit()), key=int)[-(window + 1):]
+    vals = df[year_cols].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        g = (vals[:, -1] / vals[:, 0]) ** (1 / (len(year_cols) - 1)) - 1
+    g = pd.Series(np.where(np.isfinite(g), g, 0), index=df.index)
+    g = g[~g.index.duplicated()]
+    return g.reindex(names).fillna(0).to_numpy()
+
+
+def project(P0, start_year, L, fertility, target_years, migration=None):
+    """Project P0 (n, 2, B) from start_year; returns {year: (n, 2, B)} for target_years."""
+    migration = np.zeros_like(P0) if migration is None else migration
+    out, P = {}, P0
+    for year in range(start_year + 1, max(target_years) + 1):
+        P = step(P, L, fertility, migration)
+        if year in target_years:
+            out[year] = P
+    return out
+
+
+def project_municipalities(age_path, target_years=TARGET_YEARS, totals_path=None, rates_path=None):
+    """Frame with Codigo, Municipios, the base-year POBxx and POBxx of every target year."""
+    codes, names, years, bands, P = load_age_table(age_path)
+    mortality, fertility = default_rates(bands, rates_path)
+    L = transition_matrices(bands, mortality)
+    base = P[:, -1]
+    if len(years) > 1:
+        migration = residual_migration(P, years, L, fertility)
+        source = f'residual method over {years[0]}-{years[-1]}'
+    elif totals_path and os.path.exists(totals_path):
+        migration = growth_migration(base, bands, L, fertility, total_growth(names, totals_path))
+        source = f'total growth in {os.path.basename(totals_path)}'
+    else:
+        migration = None
+        source = 'none'
+
+    t0 = time.perf_counter()
+    proj = project(base, int(years[-1]), L, fertility, target_years, migration)
+    print(f'Projected {len(codes)} municipalities x {len(bands)} bands x 2 sexes '
+          f'{years[-1]}->{max(target_years)} in {(time.perf_counter() - t0) * 1000:.1f} ms (migration: {source})')
+
+    out = pd.DataFrame({'Codigo': codes, 'Municipios': names,
+                        f'POB{str(years[-1])[2:]}': base.sum(axis=(1, 2)).round()})
+    for year in target_years:
+        out[f'POB{str(year)[2:]}'] = proj[year].sum(axis=(1, 2)).round()
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cohort-component (age x sex) population projection.')
+    parser.add_argument('--input', default=os.path.join(WORKDIR, 'poblacion_edad_sexo.csv'),
+                        help='INE export by municipality, sex and 5-year age band')
+    parser.add_argument('--totals', default=os.path.join(WORKDIR, 'poblacion_municipios_2015_2023.csv'),
+                        help='total population history used for migration when the input has one year')
+    parser.add_argument('--rates', help='CSV with edad, sexo, mortalidad, fecundidad overriding the defaults')
+    parser.add_argument('--years', type=int, nargs='+', default=TARGET_YEARS)
+    parser.add_argument('--output', default=os.path.join(WORKDIR, 'poblacion_cohortes.csv'))
+    args = parser.parse_args()
+
+    if os.path.exists(args.input):
+        out = project_municipalities(args.input, args.years, args.totals, args.rates)
+        out.to_csv(args.output, index=False)
+        print('Saved', args.output)
+    else:
+        print('age table not found:', args.input)
@@ -0,0 +1,147 @@
+"""
+Transparent columnar cache for the input CSVs.
+The first read of a CSV parses it with ine_csv.read_ine_csv and stores the
+typed frame in a columnar file; later reads of the unchanged file load only
+the requested columns from it. Entries are keyed by absolute path, mtime,
+size and read options, so an edited or replaced CSV misses automatically and
+its stale entries are removed.
+
+Storage is Parquet when pyarrow is installed, otherwise one .npy file per
+column (memory-mapped on read), which needs nothing beyond numpy.
+"""
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from ine_csv import read_ine_csv, HAS_ARROW
+
+CACHE_DIR = os.environ.get('DATACOOP_CSV_CACHE',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), '.csv_cache'))
+
+
+def _entry_prefix(path):
+    path = os.path.abspath(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{hashlib.sha256(path.encode('utf-8')).hexdigest()[:8]}-"
+
+
+def entry_name(path, read_kwargs):
+    """Cache entry name for a CSV: changes with its path, mtime, size and read options."""
+    st = os.stat(path)
+    key = repr((os.path.abspath(path), st.st_mtime_ns, st.st_size, sorted(read_kwargs.items())))
+    return _entry_prefix(path) + hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+def write_columns(entry, df):
+    """One .npy per column plus meta.json (column names and dtypes).
+
+    Text columns are dictionary-encoded: int32 codes (-1 = null) and the
+    unique values, which is both smaller and much faster to rebuild.
+    """
+    tmp = f'{entry}.{os.getpid()}.tmp'
+    os.makedirs(tmp, exist_ok=True)
+    meta = {'columns': [], 'length': len(df)}
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        item = {'name': col, 'dtype': str(s.dtype), 'file': f'{i}.npy', 'values': None}
+        if s.dtype.kind in 'biufM':
+            np.save(os.path.join(tmp, item['file']), s.to_numpy())
+        else:
+            codes, uniques = pd.factorize(s)
+            item['values'] = f'{i}.values.npy'
+            np.save(os.path.join(tmp, item['file']), codes.astype(np.int32))
+            np.save(os.path.join(tmp, item['values']), np.asarray(uniques, dtype=str))
+        meta['columns'].append(item)
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, entry)
+
+
+def read_columns(entry, columns=None):
+    with open(os.path.join(entry, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    items = {c['name']: c for c in meta['columns']}
+    out = {}
+    for name in columns if columns is not None else list(items):
+        item = items[name]
+        values = np.load(os.path.join(entry, item['file']), mmap_mode='r')
+        if item['values'] is None:
+            out[name] = pd.Series(np.asarray(values), dtype=item['dtype'])
+        else:
+            codes = np.asarray(values)
+            uniques = np.append(np.load(os.path.join(entry, item['values'])).astype(object), np.nan)
+            # code -1 (null) picks the trailing NaN
+            out[name] = pd.Series(uniques[codes], dtype=item['dtype'])
+    return pd.DataFrame(out, index=pd.RangeIndex(meta['length']))
+
+
+def _remove_stale(path, keep):
+    prefix = _entry_prefix(path)
+    for name in os.listdir(CACHE_DIR):
+        if name.startswith(prefix) and name != keep and not name.endswith('.tmp'):
+            full = os.path.join(CACHE_DIR, name)
+            if os.path.isdir(full):
+                shutil.rmtree(full, ignore_errors=True)
+            else:
+                try:
+                    os.remove(full)
+                except OSError:
+                    pass
+
+
+def read_csv_cached(path, columns=None, cache=True, **read_kwargs):
+    """read_ine_csv(path, **read_kwargs) through the columnar cache.
+
+    columns: subset to load (projection); only those columns are read from
+    the cache. The returned frame always has a RangeIndex.
+    """
+    if not cache:
+        df = read_ine_csv(path, **read_kwargs)
+        return df if columns is None else df[list(columns)]
+
+    name = entry_name(path, read_kwargs) + ('.parquet' if HAS_ARROW else '.cols')
+    entry = os.path.join(CACHE_DIR, name)
+    if os.path.exists(entry):
+        try:
+            if HAS_ARROW:
+                return pd.read_parquet(entry, columns=None if columns is None else list(columns))
+            return read_columns(entry, columns)
+        except (OSError, ValueError, KeyError, json.JSONDecodeError):
+            pass
+
+    df = read_ine_csv(path, **read_kwargs).reset_index(drop=True)
+    df.columns = [str(c) for c in df.columns]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    try:
+        if HAS_ARROW:
+            tmp = f'{entry}.{os.getpid()}.tmp'
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, entry)
+        else:
+            if os.path.exists(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            write_columns(entry, df)
+        _remove_stale(path, name)
+    except OSError as e:
+        print(f'csv_cache: could not cache {path}: {e}')
+    return df if columns is None else df[list(columns)]
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    for path in sys.argv[1:]:
+        t0 = time.perf_counter()
+        read_ine_csv(path)
+        t_csv = time.perf_counter() - t0
+        read_csv_cached(path)
+        t0 = time.perf_counter()
+        df = read_csv_cached(path)
+        t_cache = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        read_csv_cached(path, columns=list(df.columns[:3]))
+        t_proj = time.perf_counter() - t0
+        print(f'{os.path.basename(path)}: csv {t_csv * 1000:.1f} ms, cache {t_cache * 1000:.1f} ms, '
+              f'3 columns {t_proj * 1000:.1f} ms')
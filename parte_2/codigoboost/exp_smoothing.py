@@ -0,0 +1,125 @@
+"""
+Holt / damped-trend exponential smoothing for many short series at once.
+The smoothing recursion runs over years only; every step updates all
+(series x parameter candidate) lanes in one array operation, so a grid search
+plus a local refinement for all rent series takes milliseconds.
+
+Writes predicciones_alquiler_holt.csv with the same columns as
+datosfuturos/predicciones_alquiler_prophet.csv.
+"""
+import os
+import time
+import argparse
+import numpy as np
+from ine_csv import read_ine_csv
+
+WORKDIR = os.path.dirname(os.path.abspath(__file__))
+TARGET_YEARS = [2026, 2028, 2030]
+
+# Search grid: level smoothing, trend smoothing, damping (phi = 1 is plain Holt)
+ALPHAS = np.linspace(0.05, 1.0, 20)
+BETAS = np.linspace(0.0, 0.5, 11)
+PHIS = np.array([0.8, 0.85, 0.9, 0.95, 0.98, 1.0])
+
+
+def holt_sse(Y, alpha, beta, phi):
+    """One-step SSE and final (level, trend) of every series under every candidate.
+
+    Y is (n_series, n_years); alpha, beta and phi broadcast to
+    (n_series, n_candidates). Level and trend start at y0 and y1 - y0.
+    Returns (sse, level, trend), each (n_series, n_candidates).
+    """
+    alpha, beta, phi = np.broadcast_arrays(alpha, beta, phi)
+    shape = np.broadcast_shapes(alpha.shape, (Y.shape[0], 1))
+    level = np.broadcast_to(Y[:, :1], shape).copy()
+    trend = np.broadcast_to(Y[:, 1:2] - Y[:, :1], shape).copy()
+    sse = np.zeros(shape)
+    for t in range(1, Y.shape[1]):
+        pred = level + phi * trend
+        y = Y[:, t:t + 1]
+        sse += (y - pred) ** 2
+        new_level = alpha * y + (1 - alpha) * pred
+        trend = beta * (new_level - level) + (1 - beta) * phi * trend
+        level = new_level
+    return sse, level, trend
+
+
+def fit_holt(Y, grid=None, refine=True):
+    """Per-series (alpha, beta, phi, level, trend, sse) minimising the one-step SSE.
+
+    `grid` is a list of (alpha, beta, phi); by default the full ALPHAS x BETAS x
+    PHIS grid, followed by a finer search around each series' best point.
+    Returns a dict of (n_series,) arrays.
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    if grid is None:
+        a, b, p = np.meshgrid(ALPHAS, BETAS, PHIS, indexing='ij')
+    else:
+        a, b, p = np.array(grid, dtype=float).T
+    a, b, p = a.ravel()[None, :], b.ravel()[None, :], p.ravel()[None, :]
+    sse, level, trend = holt_sse(Y, a, b, p)
+    best = np.argmin(sse, axis=1)
+    rows = np.arange(len(Y))
+    fit = {'alpha': a[0, best], 'beta': b[0, best], 'phi': p[0, best],
+           'level': level[rows, best], 'trend': trend[rows, best], 'sse': sse[rows, best]}
+
+    if refine and grid is None:
+        # Second pass: 5 x 5 x 5 points around each series' own optimum
+        da, db, dp = ALPHAS[1] - ALPHAS[0], BETAS[1] - BETAS[0], 0.025
+        offs = np.linspace(-1, 1, 5)
+        oa, ob, op = (o.ravel()[None, :] for o in np.meshgrid(offs, offs, offs, indexing='ij'))
+        ra = np.clip(fit['alpha'][:, None] + oa * da, 0.01, 1.0)
+        rb = np.clip(fit['beta'][:, None] + ob * db, 0.0, 1.0)
+        rp = np.clip(fit['phi'][:, None] + op * dp, 0.5, 1.0)
+        sse, level, trend = holt_sse(Y, ra, rb, rp)
+        best = np.argmin(sse, axis=1)
+        better = sse[rows, best] < fit['sse']
+        for key, arr in (('alpha', ra), ('beta', rb), ('phi', rp), ('level', level),
+                         ('trend', trend), ('sse', sse)):
+            fit[key] = np.where(better, arr[rows, best], fit[key])
+    return fit
+
+
+def holt_forecast(fit, horizons):
+    """level + trend * (phi + phi^2 + ... + phi^h) for each horizon h >= 0."""
+    h = np.asarray(horizons, dtype=float)
+    phi = fit['phi'][:, None]
+    # Closed form of the damped sum; phi == 1 gives h
+    damp = np.where(phi < 1, phi * (1 - phi ** h) / np.where(phi < 1, 1 - phi, 1), h)
+    return fit['level'][:, None] + fit['trend'][:, None] * damp
+
+
+def forecast_alquiler_holt(path, target_years=TARGET_YEARS):
+    """Fit every rent series and return a frame with the Prophet file's columns."""
+    df = read_ine_csv(path)
+    price_cols = sorted((c for c in df.columns if c.startswith('Precio_')), key=lambda c: int(c.split('_')[1]))
+    years = np.array([int(c.split('_')[1]) for c in price_cols])
+    Y = df[price_cols].to_numpy(dtype=float)
+    ok = ~np.isnan(Y).any(axis=1)
+
+    t0 = time.perf_counter()
+    preds = np.full((len(df), len(target_years)), np.nan)
+    if ok.any():
+        fit = fit_holt(Y[ok])
+        preds[ok] = holt_forecast(fit, np.asarray(target_years) - years.max())
+    print(f'{ok.sum()} series fitted in {(time.perf_counter() - t0) * 1000:.1f} ms '
+          f'({(~ok).sum()} skipped with missing years)')
+
+    out = df[['Localización'] + price_cols].copy()
+    for j, t in enumerate(target_years):
+        out[f'Precio_{t}'] = np.round(preds[:, j], 1)
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Holt / damped-trend forecasts of rent prices.')
+    parser.add_argument('--input', default=os.path.join(WORKDIR, 'alquiler_precios_unido_imputed.csv'))
+    parser.add_argument('--output', default=os.path.join(WORKDIR, 'predicciones_alquiler_holt.csv'))
+    args = parser.parse_args()
+
+    if os.path.exists(args.input):
+        out = forecast_alquiler_holt(args.input)
+        out.to_csv(args.output, sep=';', index=False)
+        print('Saved', args.output)
+    else:
+        print('alquiler file not found:', args.input)
@@ -0,0 +1,62 @@
+"""
+Content-addressed on-disk cache for forecast results.
+Entries are keyed by a hash of everything that determines a result (series
+values, years, hyperparameters, code version), so unchanged series are never
+refitted and changed ones miss automatically.
+"""
+import os
+import pickle
+import hashlib
+import inspect
+import numpy as np
+
+
+def code_version(*funcs):
+    """Hash of the source code of the given functions."""
+    h = hashlib.sha256()
+    for f in funcs:
+        h.update(inspect.getsource(f).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def cache_key(*parts):
+    """Stable hex key for a mix of arrays, lists, dicts and scalars."""
+    h = hashlib.sha256()
+    for p in parts:
+        if isinstance(p, dict):
+            p = sorted(p.items())
+        if isinstance(p, (list, tuple, np.ndarray)) and not isinstance(p, str):
+            try:
+                arr = np.asarray(p, dtype=float)
+                h.update(b'a' + str(arr.shape).encode() + arr.tobytes())
+                continue
+            except (TypeError, ValueError):
+                pass
+        h.update(b'r' + repr(p).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _entry_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], key + '.pkl')
+
+
+def cache_get(cache_dir, key):
+    """Stored object for `key`, or None if missing or unreadable."""
+    path = _entry_path(cache_dir, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def cache_put(cache_dir, key, obj):
+    """Store `obj` under `key` (written atomically)."""
+    path = _entry_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
@@ -0,0 +1,135 @@
+"""
+In-process forecasting service.
+Loads fitted trend models once from their stores (see trend_engine) and global
+GBoost models from the model registry, and answers forecast(entity, years) from
+an LRU cache, plus a batch endpoint that serves many entities at once.
+Dashboards can request any horizon on demand instead of rerunning the
+forecasting scripts.
+"""
+import os
+import sys
+import time
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from trend_engine import load_trend_store, trends_from_stats, predict_trends
+from model_registry import ModelRegistry
+
+WORKDIR = os.path.dirname(os.path.abspath(__file__))
+# Same registry as predict_trends_gboost.REGISTRY_DIR (not imported: that module pulls in sklearn)
+REGISTRY_DIR = os.path.join(WORKDIR, 'model_registry')
+# Stores written by gboost_pred_poblacion.py and gboost_predict_renta.py
+DEFAULT_STORES = {
+    'poblacion': os.path.join(WORKDIR, 'municipios_tendencia.npz'),
+    'renta': os.path.join(WORKDIR, 'renta_tendencia.npz'),
+}
+
+
+class ForecastService:
+    """Preloaded trend and GBoost models keyed by model name and entity id."""
+
+    def __init__(self, stores=None, registry_dir=REGISTRY_DIR, cache_size=65536):
+        self._models = {}
+        for name, path in (DEFAULT_STORES if stores is None else stores).items():
+            if os.path.exists(path):
+                self.load(name, path)
+        # Global GBoost models saved by predict_trends_gboost.py --mode global
+        registry = ModelRegistry(registry_dir)
+        for reg_name in registry.names():
+            entry = registry.lookup(reg_name)
+            if entry is not None and reg_name.endswith('_global'):
+                self.load_gboost(reg_name, entry)
+        self._cached = lru_cache(maxsize=cache_size)(self._forecast)
+
+    def load(self, name, path):
+        """Load (or reload) the trend store at `path` as model `name`."""
+        names, stats, last_year = load_trend_store(path)
+        self._models[name] = {
+            'kind': 'trend',
+            'index': {str(n): i for i, n in enumerate(names)},
+            'coefs': trends_from_stats(stats),
+            'last_year': last_year,
+        }
+        if hasattr(self, '_cached'):
+            self._cached.cache_clear()
+
+    def load_gboost(self, name, entry):
+        """Register a global GBoost registry entry as model `name`.
+
+        Entities are indexed by the ids saved with the model; entries saved
+        without ids cannot be addressed by name and are skipped.
+        """
+        ids = entry.state['ids']
+        if ids is None:
+            return
+        self._models[name] = {
+            'kind': 'gboost',
+            'index': {ids[sid]: i for i, sid in enumerate(entry.state['series'])},
+            'entry': entry,
+        }
+        if hasattr(self, '_cached'):
+            self._cached.cache_clear()
+
+    def _predict_rows(self, m, rows, years):
+        """Forecasts (len(rows) x len(years)) for row positions of model m."""
+        if m['kind'] == 'trend':
+            return predict_trends(m['coefs'][rows], years)
+        # Imported here so dashboards using only trend models do not load sklearn
+        from predict_trends_gboost import recursive_forecast
+        entry = m['entry']
+        st = entry.state
+        scaled = recursive_forecast(entry.model.predict, st['last'][rows], st['year_min'][rows],
+                                    st['year_max'][rows], list(years), static=st['static'][rows])
+        return np.column_stack([scaled[y] * st['scale'][rows] for y in years])
+
+    def models(self):
+        return sorted(self._models)
+
+    def entities(self, model):
+        return list(self._models[model]['index'])
+
+    def _forecast(self, model, entity_id, years):
+        m = self._models[model]
+        i = m['index'].get(str(entity_id))
+        if i is None:
+            raise KeyError(f'{entity_id!r} not found in model {model!r}')
+        return tuple(self._predict_rows(m, np.array([i]), years)[0].tolist())
+
+    def forecast(self, model, entity_id, years):
+        """Forecast of one entity for `years` as {year: value} (LRU cached)."""
+        years = tuple(int(y) for y in years)
+        return dict(zip(years, self._cached(model, entity_id, years)))
+
+    def forecast_batch(self, model, entity_ids, years):
+        """Forecasts for many entities as a DataFrame (entities x years).
+
+        All known entities are served in one batched call; unknown ones get
+        NaN rows.
+        """
+        m = self._models[model]
+        years = [int(y) for y in years]
+        idx = np.array([m['index'].get(str(e), -1) for e in entity_ids], dtype=int)
+        out = np.full((len(idx), len(years)), np.nan)
+        if (idx >= 0).any():
+            out[idx >= 0] = self._predict_rows(m, idx[idx >= 0], years)
+        return pd.DataFrame(out, index=list(entity_ids), columns=years)
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+
+if __name__ == '__main__':
+    # Uso: python forecast_service.py poblacion Abades 2024 2030
+    if len(sys.argv) < 5:
+        print('usage: forecast_service.py MODEL ENTITY FIRST_YEAR LAST_YEAR')
+        sys.exit(1)
+    model, entity, first, last = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+    service = ForecastService()
+    years = range(first, last + 1)
+    for y, v in service.forecast(model, entity, years).items():
+        print(f'{y}: {v:,.2f}')
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        service.forecast(model, entity, years)
+    # 1000 calls: total seconds * 1000 = microseconds per call
+    print(f'cached lookup: {(time.perf_counter() - t0) * 1000:.2f} us per call')
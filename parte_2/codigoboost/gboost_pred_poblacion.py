@@ -1,33 +1,130 @@
+import os
+import time
+import argparse
 import pandas as pd
-from sklearn.linear_model import LinearRegression
 import numpy as np
+from trend_engine import (fit_trends, predict_trends, trend_stats, update_stats,
+                          trends_from_stats, save_trend_store, load_trend_store,
+                          bootstrap_intervals, shrink_trends)
+from model_tournament import run_tournament, BUDGET, THRESHOLD
+from ine_csv import read_ine_csv
+from muni_index import lookup_codes
 
-# Cargar el CSV original
-df = pd.read_csv(r"C:\Users\clara\Documentos\3º GED\poblacion_municipios_2015_2023.csv")
-df.fillna(df.mean(numeric_only=True), inplace=True)
+CSV_PATH = r"C:\Users\clara\Documentos\3º GED\poblacion_municipios_2015_2023.csv"
+# Estadísticos suficientes por municipio para el modo incremental
+# (junto al script, donde lo busca forecast_service.py)
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'municipios_tendencia.npz')
 
-
-# Años históricos
-years = np.array([2015, 2016, 2017, 2018, 2019, 2020, 2021, 2022, 2023]).reshape(-1, 1)
+parser = argparse.ArgumentParser(description='Predicción lineal de población por municipio.')
+parser.add_argument('--incremental', action='store_true',
+                    help='solo lee los años nuevos del CSV y actualiza las tendencias guardadas')
+parser.add_argument('--bootstrap', type=int, default=200,
+                    help='remuestreos para los intervalos p10/p50/p90 (0 = solo predicción puntual)')
+parser.add_argument('--auto', action='store_true',
+                    help='elegir modelo por municipio (lineal, Holt amortiguado, último crecimiento; '
+                         'GBoost solo donde fallan) en lugar de la tendencia lineal')
+parser.add_argument('--budget', type=float, default=BUDGET,
+                    help='segundos de ajustes GBoost permitidos con --auto')
+parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                    help='MAPE de validación a partir del cual --auto prueba GBoost')
+parser.add_argument('--shrink', action='store_true',
+                    help='encoger la pendiente de cada municipio hacia la de su provincia (Bayes empírico)')
+args = parser.parse_args()
 
 # Años a predecir
 future_years = [2026, 2028, 2030]
-future_years_array = np.array(future_years).reshape(-1, 1)
+# Percentiles de los intervalos de predicción
+QUANTILES = (10, 50, 90)
+
+
+def provincias(municipios, ultimo):
+    """CPRO de cada municipio según el índice de municipios; con nombres repetidos, el de población más parecida."""
+    codes = lookup_codes(municipios, population=ultimo, label='provincias (--shrink)')
+    cpro = pd.Series(codes // 1000).astype(str).str.zfill(2)
+    return cpro.where(codes >= 0, 'sin_provincia').to_numpy()
+
+if args.incremental:
+    # Cargar estadísticos guardados y leer solo las columnas de años nuevos
+    names, stats, last_year = load_trend_store(STORE_PATH)
+    header = read_ine_csv(CSV_PATH, nrows=0).columns
+    new_years = sorted(int(c) for c in header[1:] if int(c) > last_year)
+    print(f"Años nuevos desde {last_year}: {new_years}")
+
+    new = read_ine_csv(CSV_PATH, usecols=['Municipios'] + [str(y) for y in new_years])
+    new.fillna(new.mean(numeric_only=True), inplace=True)
+    new = new.set_index('Municipios')
+    nuevos = new.index.difference(names)
+    if len(nuevos):
+        print(f"{len(nuevos)} municipios sin historial guardado (requieren ejecución completa): {list(nuevos[:5])}")
+    new = new.reindex(names)
+
+    for y in new_years:
+        update_stats(stats, y, new[str(y)].to_numpy(dtype=float))
+        last_year = y
+
+    predictions = predict_trends(trends_from_stats(stats), future_years)
+    results = pd.DataFrame(np.round(predictions), columns=[str(y) for y in future_years])
+    results.insert(0, 'Municipios', names)
+    save_trend_store(STORE_PATH, names, stats, last_year)
+    results.to_csv('municipios_predicciones_incremental.csv', index=False)
+    print("Predicciones actualizadas guardadas en 'municipios_predicciones_incremental.csv'")
+else:
+    # Cargar el CSV original
+    df = read_ine_csv(CSV_PATH)
+    df.fillna(df.mean(numeric_only=True), inplace=True)
+
+    # Años históricos
+    years = np.array([int(c) for c in df.columns[1:]])
+
+    # Predecir todos los municipios de una vez (una sola resolución de mínimos cuadrados)
+    t0 = time.perf_counter()
+    values = df[[str(y) for y in years]].to_numpy(dtype=float)
+    coefs = fit_trends(years, values)
+    predictions = predict_trends(coefs, future_years)
+    print(f"Tendencias ajustadas para {len(df)} municipios en {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    if args.shrink:
+        # Pendientes encogidas hacia la media de la provincia (forma cerrada, agrupada)
+        prov = provincias(df['Municipios'], values[:, -1])
+        print(f"{(prov == 'sin_provincia').sum()} municipios sin provincia en el padrón (usan la media nacional)")
+        coefs, peso_propio = shrink_trends(years, values, prov)
+        predictions = predict_trends(coefs, future_years)
+
+    if args.auto:
+        # Torneo de modelos: los baratos para todos, GBoost solo donde fallan y dentro del presupuesto
+        # (sklearn solo se carga aquí)
+        from predict_trends_gboost import gboost_holdout_fit, local_features
+        t0 = time.perf_counter()
+        chosen = run_tournament([(years, v) for v in values], future_years, gboost_holdout_fit,
+                                args.threshold, args.budget, prepare=local_features)
+        predictions = np.array([[p[y] for y in future_years] for p, _, _, _ in chosen])
+        print(f"Modelos elegidos para {len(df)} municipios en {time.perf_counter() - t0:.1f} s")
+
+    # Crear nuevo DataFrame para resultados
+    results = pd.DataFrame(np.round(predictions), columns=[str(y) for y in future_years], index=df.index)
+    if args.shrink and not args.auto:
+        # Peso que conserva la pendiente propia del municipio (1 = sin encoger)
+        results['peso_propio'] = np.round(peso_propio, 3)
+    if args.auto:
+        results['model'] = [c['model'] for _, _, _, c in chosen]
+        results['cv_mape'] = [c['cv_mape'] for _, _, _, c in chosen]
 
-# Crear nuevo DataFrame para resultados
-results = df[['Municipios']].copy()
+    # Intervalos de predicción por bootstrap de residuos (solo para la tendencia lineal)
+    if args.bootstrap > 0 and not args.auto:
+        t0 = time.perf_counter()
+        # Con --shrink las bandas se centran en las tendencias encogidas, como la predicción puntual
+        bands = bootstrap_intervals(years, values, future_years, n_boot=args.bootstrap, quantiles=QUANTILES,
+                                    coefs=coefs)
+        print(f"Intervalos p10/p50/p90 ({args.bootstrap} remuestreos) en {time.perf_counter() - t0:.2f} s")
+        for j, y in enumerate(future_years):
+            for k, q in enumerate(QUANTILES):
+                results[f'{y}_p{q}'] = np.round(bands[k, :, j])
 
-# Predecir para cada municipio
-for index, row in df.iterrows():
-    values = row[1:].values.astype(float)
-    model = LinearRegression()
-    model.fit(years, values)
-    predictions = model.predict(future_years_array)
-    for year, pred in zip(future_years, predictions):
-        results.loc[index, str(year)] = round(pred)
+    # Combinar con datos originales
+    final_df = pd.merge(df, results, left_index=True, right_index=True)
 
-# Combinar con datos originales
-final_df = pd.merge(df, results.drop(columns=['Municipios']), left_index=True, right_index=True)
+    # Guardar estadísticos para futuras actualizaciones incrementales
+    save_trend_store(STORE_PATH, df['Municipios'], trend_stats(years, values), years.max())
 
-# Guardar en nuevo CSV
-final_df.to_csv('municipios_predicciones.csv', index=False)
+    # Guardar en nuevo CSV
+    final_df.to_csv('municipios_predicciones.csv', index=False)
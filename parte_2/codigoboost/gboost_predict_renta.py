@@ -1,36 +1,84 @@
+import os
+import argparse
 import pandas as pd
-from sklearn.linear_model import LinearRegression
+from ine_csv import read_ine_csv
 import numpy as np
+from trend_engine import (fit_trends, predict_trends, trend_stats, update_stats,
+                          trends_from_stats, save_trend_store, load_trend_store,
+                          bootstrap_intervals)
 
-# Cargar el CSV
-df = pd.read_csv('renta_provincias_2015_2023.csv')
+CSV_PATH = 'renta_provincias_2015_2023.csv'
+# Estadísticos suficientes por provincia para el modo incremental
+# (junto al script, donde lo busca forecast_service.py)
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'renta_tendencia.npz')
 
-# Años históricos
-years = np.array([2015, 2016, 2017, 2018, 2019, 2020, 2021, 2022, 2023]).reshape(-1, 1)
+parser = argparse.ArgumentParser(description='Predicción lineal de renta por provincia.')
+parser.add_argument('--incremental', action='store_true',
+                    help='solo lee los años nuevos del CSV y actualiza las tendencias guardadas')
+parser.add_argument('--bootstrap', type=int, default=200,
+                    help='remuestreos para los intervalos p10/p50/p90 (0 = solo predicción puntual)')
+args = parser.parse_args()
 
 # Años a predecir
 future_years = [2026, 2028, 2030]
-future_years_array = np.array(future_years).reshape(-1, 1)
+# Percentiles de los intervalos de predicción
+QUANTILES = (10, 50, 90)
 
-# Crear nuevo DataFrame para resultados
-results = df[['Provincias']].copy()
+if args.incremental:
+    # Cargar estadísticos guardados y leer solo las columnas de años nuevos
+    names, stats, last_year = load_trend_store(STORE_PATH)
+    header = read_ine_csv(CSV_PATH, nrows=0).columns
+    new_years = sorted(int(c) for c in header[1:] if int(c) > last_year)
+    print(f"Años nuevos desde {last_year}: {new_years}")
 
-# Predecir para cada provincia
-for index, row in df.iterrows():
-    values = row[1:].values.astype(float)
+    new = read_ine_csv(CSV_PATH, usecols=['Provincias'] + [str(y) for y in new_years]).set_index('Provincias')
+    nuevas = new.index.difference(names)
+    if len(nuevas):
+        print(f"{len(nuevas)} provincias sin historial guardado (requieren ejecución completa): {list(nuevas)}")
+    new = new.reindex(names)
 
-    # Verificar si hay NaN
-    if np.isnan(values).any():
-        print(f"Saltando provincia con datos faltantes: {row['Provincias']}")
-        continue
+    for y in new_years:
+        update_stats(stats, y, new[str(y)].to_numpy(dtype=float))
+        last_year = y
 
-    model = LinearRegression()
-    model.fit(years, values)
-    predictions = model.predict(future_years_array)
+    predictions = np.round(predict_trends(trends_from_stats(stats), future_years), 3)
+    results = pd.DataFrame(predictions, columns=[str(y) for y in future_years])
+    results.insert(0, 'Provincias', names)
+    save_trend_store(STORE_PATH, names, stats, last_year)
+    results.to_csv('prediccion_renta_incremental.csv', index=False)
+    print("Predicciones actualizadas guardadas en 'prediccion_renta_incremental.csv'")
+else:
+    # Cargar el CSV
+    df = read_ine_csv(CSV_PATH)
 
-    for year, pred in zip(future_years, predictions):
-        results.loc[index, str(year)] = round(pred, 3)  # Redondeo a 3 decimales
+    # Años históricos
+    years = np.array([int(c) for c in df.columns[1:]])
 
-# Combinar y guardar
-final_df = pd.merge(df, results.drop(columns=['Provincias']), left_index=True, right_index=True)
-final_df.to_csv('prediccion_renta.csv', index=False)
+    # Predecir todas las provincias de una vez
+    values = df[[str(y) for y in years]].to_numpy(dtype=float)
+
+    # Verificar si hay NaN (esas provincias quedan sin predicción)
+    for prov in df.loc[np.isnan(values).any(axis=1), 'Provincias']:
+        print(f"Saltando provincia con datos faltantes: {prov}")
+
+    coefs = fit_trends(years, values)
+    predictions = np.round(predict_trends(coefs, future_years), 3)  # Redondeo a 3 decimales
+
+    # Crear nuevo DataFrame para resultados
+    results = pd.DataFrame(predictions, columns=[str(y) for y in future_years], index=df.index)
+
+    # Intervalos de predicción por bootstrap de residuos (todas las provincias a la vez)
+    if args.bootstrap > 0:
+        bands = np.round(bootstrap_intervals(years, values, future_years, n_boot=args.bootstrap,
+                                             quantiles=QUANTILES), 3)
+        for j, y in enumerate(future_years):
+            for k, q in enumerate(QUANTILES):
+                results[f'{y}_p{q}'] = bands[k, :, j]
+
+    # Combinar y guardar
+    final_df = pd.merge(df, results, left_index=True, right_index=True)
+
+    # Guardar estadísticos para futuras actualizaciones incrementales
+    save_trend_store(STORE_PATH, df['Provincias'], trend_stats(years, values), years.max())
+
+    final_df.to_csv('prediccion_renta.csv', index=False)
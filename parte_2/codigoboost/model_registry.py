@@ -0,0 +1,89 @@
+"""
+Local model registry.
+Stores fitted models on disk together with their metadata (training data hash,
+hyperparameters, CV metrics, feature list) so that scoring, plotting and the
+forecast service reuse them instead of retraining. Metadata is plain JSON;
+the pickled model is only loaded when it is first used.
+"""
+import os
+import json
+import time
+import pickle
+
+
+class RegisteredModel:
+    """A registry entry: metadata in memory, model and state loaded on demand."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self._payload = None
+
+    def _load(self):
+        if self._payload is None:
+            with open(self.path, 'rb') as f:
+                self._payload = pickle.load(f)
+        return self._payload
+
+    @property
+    def model(self):
+        return self._load()['model']
+
+    @property
+    def state(self):
+        return self._load()['state']
+
+    def __repr__(self):
+        return f"RegisteredModel({self.meta['name']!r}, data_hash={self.meta['data_hash'][:12]})"
+
+
+class ModelRegistry:
+    """Directory of models: <root>/<name>/<data_hash>.{pkl,json} plus latest.json."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _dir(self, name):
+        return os.path.join(self.root, name)
+
+    def names(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isdir(self._dir(d)))
+
+    def lookup(self, name, data_hash=None):
+        """Entry of `name` trained on `data_hash` (latest entry if None), or None."""
+        meta_name = 'latest.json' if data_hash is None else f'{data_hash}.json'
+        meta_path = os.path.join(self._dir(name), meta_name)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        path = os.path.join(self._dir(name), f"{meta['data_hash']}.pkl")
+        if not os.path.exists(path):
+            return None
+        return RegisteredModel(path, meta)
+
+    def save(self, name, model, data_hash, params=None, metrics=None, features=None, state=None):
+        """Store a fitted model and make it the latest entry of `name`."""
+        d = self._dir(name)
+        os.makedirs(d, exist_ok=True)
+        path = os.path.join(d, f'{data_hash}.pkl')
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({'model': model, 'state': state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+        meta = {
+            'name': name,
+            'data_hash': data_hash,
+            'model_class': type(model).__name__,
+            'params': params or {},
+            'metrics': metrics or {},
+            'features': list(features or []),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        for meta_name in (f'{data_hash}.json', 'latest.json'):
+            with open(os.path.join(d, meta_name), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2, default=float)
+        return RegisteredModel(path, meta)
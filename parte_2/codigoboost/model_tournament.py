@@ -0,0 +1,195 @@
+"""
+Per-series model tournament under a compute budget.
+Cheap candidates (linear trend, damped Holt, last growth) are fitted to every
+series at once with array operations and scored by rolling-origin one-step CV
+over the last HOLDOUT years. Only the series whose best cheap CV error exceeds
+a threshold are handed to the expensive model (GBoost), worst first, until a
+global time budget runs out. Each series keeps whichever model has the lowest
+CV error.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from trend_engine import fit_trends, predict_trends
+from exp_smoothing import fit_holt, holt_forecast
+
+HOLDOUT = 3
+# CV MAPE above which a series is worth an expensive fit
+THRESHOLD = 0.02
+# Seconds of expensive fits per run
+BUDGET = 60.0
+
+# Damped Holt smoothing grid (level, trend, damping), searched per series
+HOLT_GRID = [(a, b, phi) for a in (0.3, 0.6, 0.9) for b in (0.1, 0.3) for phi in (0.8, 0.9, 0.98)]
+
+
+def linear_forecast(years, Y, target_years):
+    return predict_trends(fit_trends(years, Y), target_years)
+
+
+def last_growth_forecast(years, Y, target_years):
+    """Last observed growth rate compounded forward."""
+    last, prev = Y[:, -1], Y[:, -2]
+    g = np.divide(last - prev, prev, out=np.zeros_like(last), where=prev != 0)
+    h = np.asarray(target_years, dtype=float) - years[-1]
+    return last[:, None] * (1 + g[:, None]) ** h
+
+
+def damped_holt_forecast(years, Y, target_years):
+    """Damped-trend Holt smoothing with (alpha, beta, phi) chosen per series from HOLT_GRID."""
+    fit = fit_holt(Y, grid=HOLT_GRID)
+    return holt_forecast(fit, np.asarray(target_years, dtype=float) - years[-1])
+
+
+CHEAP_MODELS = {
+    'linear': linear_forecast,
+    'damped_holt': damped_holt_forecast,
+    'last_growth': last_growth_forecast,
+}
+
+
+def holdout_size(n_years, holdout=HOLDOUT):
+    """Origins usable for CV: at least 3 training years per origin."""
+    return max(0, min(holdout, n_years - 3))
+
+
+def cheap_cv(years, Y, holdout=HOLDOUT):
+    """Rolling-origin one-step predictions of every cheap model.
+
+    Returns {model: (n_series, k) predictions} for the last k years, with
+    k = holdout_size(len(years)).
+    """
+    years = np.asarray(years)
+    k = holdout_size(len(years), holdout)
+    preds = {name: np.full((Y.shape[0], k), np.nan) for name in CHEAP_MODELS}
+    for j, cut in enumerate(range(len(years) - k, len(years))):
+        for name, model in CHEAP_MODELS.items():
+            preds[name][:, j] = model(years[:cut], Y[:, :cut], [years[cut]])[:, 0]
+    return preds
+
+
+def cv_scores(actual, pred):
+    """MAPE and r2 per series of holdout predictions (NaN-safe)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mape = np.mean(np.abs(pred - actual) / np.abs(actual), axis=1)
+        ss_res = np.sum((actual - pred) ** 2, axis=1)
+        ss_tot = np.sum((actual - actual.mean(axis=1, keepdims=True)) ** 2, axis=1)
+        r2 = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.where(ss_res == 0, 1.0, 0.0))
+    mape = np.where(np.isfinite(mape), mape, np.inf)
+    return mape, r2
+
+
+def observed(years, values):
+    """(years, values) restricted to the years with a finite value."""
+    years, values = np.asarray(years), np.asarray(values, dtype=float)
+    keep = np.isfinite(values)
+    return years[keep], values[keep]
+
+
+def _run_expensive(fit, inputs, todo, budget, workers):
+    """Run fit(*inputs[i]) on series `todo` in order until `budget` seconds.
+
+    Returns {index: result}; series not reached are missing.
+    """
+    done = {}
+    t0 = time.perf_counter()
+    if workers <= 1:
+        for i in todo:
+            if time.perf_counter() - t0 > budget:
+                break
+            done[i] = fit(*inputs[i])
+        return done
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        queue = iter(todo)
+        for i in queue:
+            pending[pool.submit(fit, *inputs[i])] = i
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                done[pending.pop(fut)] = fut.result()
+                # Keep the pool fed while there is budget left
+                if time.perf_counter() - t0 <= budget:
+                    i = next(queue, None)
+                    if i is not None:
+                        pending[pool.submit(fit, *inputs[i])] = i
+    return done
+
+
+def run_tournament(series, target_years, expensive=None, threshold=THRESHOLD, budget=BUDGET,
+                   workers=1, holdout=HOLDOUT, prepare=None):
+    """Pick a model per series and forecast `target_years`.
+
+    `series` is a list of (years, values). `expensive(years, values,
+    target_years)` must return (predictions dict, cv_mape, cv_r2,
+    feature_importance) using the same holdout; it is only called for series
+    whose best cheap CV MAPE exceeds `threshold`, worst first, while the
+    `budget` in seconds lasts. `prepare(series)`, if given, builds the
+    per-series inputs of `expensive` for all those series in one batch; each
+    result is passed to `expensive` as a fourth argument.
+    Returns one (predictions, cv_r2, feature_importance, choice) tuple per
+    series, where choice = {'model': name, 'cv_mape': score}.
+    Missing values are dropped first, so every model is fitted and scored on
+    the observed years of each series only.
+    """
+    series = [observed(years, vals) for years, vals in series]
+    n = len(series)
+    preds = np.full((n, len(target_years)), np.nan)
+    best_mape = np.full(n, np.inf)
+    best_r2 = np.full(n, np.nan)
+    best_model = np.array(['none'] * n, dtype=object)
+
+    # Cheap models: one vectorized pass per group of series sharing the same years
+    groups = {}
+    for i, (years, vals) in enumerate(series):
+        groups.setdefault(tuple(int(y) for y in years), []).append(i)
+    for years, idx in groups.items():
+        years = np.array(years)
+        order = np.argsort(years)
+        years = years[order]
+        Y = np.array([series[i][1][order] for i in idx])
+        if len(years) < 2:
+            continue
+        rows = np.array(idx)
+        k = holdout_size(len(years), holdout)
+        cv = cheap_cv(years, Y, holdout) if k else {}
+        for name, model in CHEAP_MODELS.items():
+            fc = model(years, Y, target_years)
+            if k:
+                mape, r2 = cv_scores(Y[:, -k:], cv[name])
+            else:
+                mape, r2 = np.full(len(rows), np.inf), np.full(len(rows), np.nan)
+            # The first candidate fills in series without CV; later ones only replace on a lower error
+            better = (mape < best_mape[rows]) | (best_model[rows] == 'none')
+            sel = rows[better]
+            preds[sel], best_mape[sel], best_r2[sel] = fc[better], mape[better], r2[better]
+            best_model[sel] = name
+
+    # Expensive model for the worst-served series, under the time budget
+    importance = [None] * n
+    todo = [i for i in np.argsort(-best_mape, kind='stable')
+            if best_mape[i] > threshold and len(series[i][0]) >= 3]
+    n_expensive = 0
+    if expensive is not None and todo and budget > 0:
+        t0 = time.perf_counter()
+        inputs = {i: (*series[i], target_years) for i in todo}
+        if prepare is not None:
+            for i, extra in zip(todo, prepare([series[i] for i in todo])):
+                inputs[i] += (extra,)
+        done = _run_expensive(expensive, inputs, todo, budget, workers)
+        n_expensive = len(done)
+        for i, (p, mape, r2, imp) in done.items():
+            if mape < best_mape[i] or best_model[i] == 'none':
+                preds[i] = [p[t] for t in target_years]
+                best_mape[i], best_r2[i], best_model[i], importance[i] = mape, r2, 'gboost', imp
+        print(f'  tournament: {len(todo)} series above CV MAPE {threshold:.1%}, '
+              f'{n_expensive} given GBoost in {time.perf_counter() - t0:.1f}s (budget {budget:.0f}s)')
+
+    names, counts = np.unique(best_model, return_counts=True)
+    print('  chosen models: ' + ', '.join(f'{m} {c}' for m, c in zip(names, counts)))
+    best_mape[~np.isfinite(best_mape)] = np.nan
+    return [({t: float(preds[i, j]) for j, t in enumerate(target_years)}, float(best_r2[i]), importance[i],
+             {'model': best_model[i], 'cv_mape': float(best_mape[i])})
+            for i in range(n)]
@@ -0,0 +1,196 @@
+"""
+Municipality index: every name variant seen in the project files mapped once
+to the packed INE code CODMUN (CPRO * 1000 + CMUN, see schema.py).
+
+Names are reduced to a key (no accents, lower case, punctuation as spaces,
+trailing article moved to the front: 'Coruña, A', 'A Coruña' and 'coruña, a'
+all give 'a coruna'); bilingual names ('Castellón de la Plana/Castelló de la
+Plana') also get a key for each side. The keys of the Padrón
+(poblacion/poblacion_municipio.csv) and of the files that already carry
+CPRO/CMUN (bancos_por_municipio.csv) are stored in municipios_index.csv.
+
+A name-only table is resolved with one join on the key. A key shared by
+several municipalities is narrowed down by province when the table has one,
+else by the closest POB24 when it has a population column, else it is
+reported as ambiguous. After that every join is on the int32 CODMUN, and
+the rows left without a code are printed instead of being dropped silently.
+
+    python muni_index.py            rebuild the index and report coverage of the name-only files
+"""
+import os
+import re
+import argparse
+import unicodedata
+import numpy as np
+import pandas as pd
+from ine_csv import read_ine_csv
+from csv_cache import read_csv_cached
+from schema import CODE_COL, pack_code
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'municipios_index.csv')
+PADRON_PATH = os.path.join(ROOT, 'poblacion', 'poblacion_municipio.csv')
+# Ficheros con CPRO/CMUN cuyos nombres se añaden como variantes: (ruta, columna de nombre)
+CODED_SOURCES = [(os.path.join(ROOT, 'bancos', 'bancos_por_municipio.csv'), 'NMUN')]
+# Ficheros solo con nombre: (ruta, columna de nombre, columna de población o None)
+NAME_ONLY_SOURCES = [
+    (os.path.join(ROOT, 'df_merged_output.csv'), 'Municipio', 'poblacion'),
+    (os.path.join(ROOT, 'parte_2', 'datosfuturos', 'municipios_predicciones.csv'), 'Municipios', '2023'),
+]
+
+ARTICLES = {'a', 'o', 'as', 'os', 'el', 'la', 'los', 'las', 'lo', 'l', 'els', 'les', 'es', 'sa', 'ses', 'illes'}
+
+
+def normalize_name(name):
+    """Lookup key of a municipality or province name."""
+    s = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode().lower()
+    s = re.sub(r"[^a-z0-9,]+", ' ', s)
+    head, sep, tail = s.rpartition(',')
+    if sep and tail.strip() in ARTICLES:
+        s = f'{tail} {head}'
+    return ' '.join(s.replace(',', ' ').split())
+
+
+def name_keys(name):
+    """Keys of a name: the whole name plus each side of a bilingual 'A/B' name."""
+    parts = str(name).split('/')
+    keys = [normalize_name(name)] + ([normalize_name(p) for p in parts] if len(parts) > 1 else [])
+    return list(dict.fromkeys(k for k in keys if k))
+
+
+def _explode_keys(names):
+    """(position, key) pairs for every key of every name."""
+    keys = pd.Series(list(names)).map(name_keys).explode().dropna()
+    return pd.DataFrame({'pos': keys.index.to_numpy(), 'clave': keys.to_numpy()})
+
+
+def build_index(padron_path=PADRON_PATH, coded_sources=CODED_SOURCES):
+    """Lookup table clave -> CODMUN with the canonical NOMBRE, PROVINCIA and POB24."""
+    ref = read_csv_cached(padron_path, columns=['CPRO', 'PROVINCIA', 'CMUN', 'NOMBRE', 'POB24'],
+                          skiprows=1, dtype={'CPRO': str, 'CMUN': str})
+    ref = ref[pd.to_numeric(ref['CPRO'], errors='coerce').notna()]
+    munis = pd.DataFrame({CODE_COL: pack_code(ref['CPRO'], ref['CMUN']), 'NOMBRE': ref['NOMBRE'].to_numpy(),
+                          'PROVINCIA': ref['PROVINCIA'].to_numpy(), 'POB24': ref['POB24'].to_numpy()})
+
+    pairs = [pd.DataFrame({CODE_COL: munis[CODE_COL], 'nombre': munis['NOMBRE']})]
+    for path, col in coded_sources:
+        if os.path.exists(path):
+            src = read_csv_cached(path, columns=['CPRO', 'CMUN', col], dtype={'CPRO': str, 'CMUN': str})
+            pairs.append(pd.DataFrame({CODE_COL: pack_code(src['CPRO'], src['CMUN']), 'nombre': src[col]}))
+    pairs = pd.concat(pairs, ignore_index=True)
+
+    keys = _explode_keys(pairs['nombre'])
+    index = pd.DataFrame({'clave': keys['clave'].to_numpy(),
+                          CODE_COL: pairs[CODE_COL].to_numpy()[keys['pos'].to_numpy()]})
+    index = index.drop_duplicates().merge(munis, on=CODE_COL, how='inner')
+    return index.sort_values(['clave', CODE_COL]).reset_index(drop=True)
+
+
+def load_index(path=INDEX_PATH, rebuild=False):
+    """The stored lookup table (built and saved on first use)."""
+    if rebuild or not os.path.exists(path):
+        index = build_index()
+        index.to_csv(path, index=False)
+    else:
+        index = read_csv_cached(path, dtype={'clave': str})
+    return index.astype({CODE_COL: np.int32, 'POB24': np.int32})
+
+
+def province_codes(index):
+    """Series key of a province name -> CPRO (int)."""
+    prov = index[['PROVINCIA', CODE_COL]].drop_duplicates('PROVINCIA')
+    keys = _explode_keys(prov['PROVINCIA'])
+    cpro = prov[CODE_COL].to_numpy()[keys['pos'].to_numpy()] // 1000
+    return pd.Series(cpro, index=keys['clave'].to_numpy()).groupby(level=0).first()
+
+
+def lookup_codes(names, provinces=None, population=None, index=None, label='municipios'):
+    """CODMUN (int32, -1 = sin código) for each name, plus a printed report of the unresolved ones.
+
+    provinces: province names or CPRO of each row (narrows repeated names).
+    population: population of each row; among several candidates, the
+    municipality with the closest POB24 wins. Codes are unique: when several
+    rows resolve to the same municipality, only the row whose population is
+    closest to its POB24 (the first one without population) keeps it.
+    """
+    index = load_index() if index is None else index
+    names = pd.Series(list(names))
+    n = len(names)
+    # Solo se prueban las mitades de un nombre bilingüe si el nombre completo no aparece
+    keys = _explode_keys(names)
+    keys['rank'] = keys.groupby('pos').cumcount()
+    cand = keys.merge(index[['clave', CODE_COL, 'POB24']], on='clave', how='inner')
+    cand = cand[cand['rank'] == cand.groupby('pos')['rank'].transform('min')]
+
+    if provinces is not None:
+        prov = pd.Series(list(provinces))
+        cpro = pd.to_numeric(prov, errors='coerce')
+        by_name = prov.map(lambda p: normalize_name(p)).map(province_codes(index))
+        cpro = cpro.fillna(by_name).to_numpy()[cand['pos'].to_numpy()]
+        keep = np.isnan(cpro) | (cand[CODE_COL].to_numpy() // 1000 == cpro)
+        cand = cand[keep]
+
+    cand = cand.drop_duplicates(['pos', CODE_COL])
+    if population is not None:
+        pop = pd.to_numeric(pd.Series(list(population)), errors='coerce').to_numpy(dtype=float)
+        cand = cand.assign(dist=np.abs(cand['POB24'].to_numpy(dtype=float) - pop[cand['pos'].to_numpy()]))
+        cand = cand.sort_values(['pos', 'dist'], na_position='last').drop_duplicates('pos')
+
+    counts = cand.groupby('pos').size()
+    unique = counts.index[counts == 1]
+    codes = np.full(n, -1, dtype=np.int32)
+    first = cand.drop_duplicates('pos').set_index('pos').loc[unique, CODE_COL]
+    codes[first.index.to_numpy()] = first.to_numpy()
+
+    # Un código por fila como mucho: si varios nombres dan el mismo municipio
+    # ('Gatova' y 'Gátova') se queda la fila de población más parecida a POB24
+    # (sin población, la primera)
+    hit = pd.DataFrame({'pos': np.flatnonzero(codes >= 0), CODE_COL: codes[codes >= 0]})
+    if population is not None:
+        pob24 = index.drop_duplicates(CODE_COL).set_index(CODE_COL)['POB24']
+        hit['dist'] = np.abs(hit[CODE_COL].map(pob24).to_numpy(dtype=float) - pop[hit['pos'].to_numpy()])
+    else:
+        hit['dist'] = 0.0
+    hit = hit.sort_values([CODE_COL, 'dist', 'pos'], na_position='last')
+    repeated = hit['pos'][hit.duplicated(CODE_COL)].sort_values().to_numpy()
+    codes[repeated] = -1
+
+    ambiguous = names.iloc[counts.index[counts > 1]]
+    missing = names[~names.index.isin(counts.index)]
+    duplicated = names.iloc[repeated]
+    print(f'{label}: {(codes >= 0).sum()}/{n} con código; {len(missing)} sin coincidencia, '
+          f'{len(ambiguous)} ambiguos, {len(duplicated)} con código repetido')
+    for tipo, bad in (('sin coincidencia', missing), ('ambiguos', ambiguous),
+                      ('código repetido (se descartan)', duplicated)):
+        if len(bad):
+            print(f'  {tipo}: {list(bad.head(10))}{" ..." if len(bad) > 10 else ""}')
+    return codes
+
+
+def attach_codes(df, name_col, province_col=None, population_col=None, index=None, label=None):
+    """df with a unique CODMUN column, without the rows that could not be resolved (reported)."""
+    codes = lookup_codes(df[name_col],
+                         None if province_col is None else df[province_col],
+                         None if population_col is None else df[population_col],
+                         index=index, label=label or name_col)
+    out = df.copy()
+    out.insert(0, CODE_COL, codes)
+    return out[codes >= 0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Índice de municipios: variantes de nombre -> código INE.')
+    parser.add_argument('--check', nargs='+', metavar='RUTA:COLUMNA[:POBLACION]',
+                        help='ficheros solo con nombre cuya cobertura se informa (por defecto los del proyecto)')
+    args = parser.parse_args()
+
+    index = load_index(rebuild=True)
+    print(f'{INDEX_PATH}: {len(index)} claves, {index[CODE_COL].nunique()} municipios')
+    checks = [c.split(':') for c in args.check] if args.check else \
+        [(p, n) + ((c,) if c else ()) for p, n, c in NAME_ONLY_SOURCES]
+    for path, col, *pop in checks:
+        if not os.path.exists(path):
+            print('no encontrado:', path)
+            continue
+        df = read_ine_csv(path)
+        lookup_codes(df[col], population=df[pop[0]] if pop else None, index=index, label=os.path.basename(path))
@@ -2,12 +2,22 @@
 Predict trends using GradientBoostingRegressor with engineered features.
 Generates CSV files with forecasts for target years (2026/2028/2030).
 Uses cross-validation and feature importance analysis.
+Series can be spread over a process pool with --workers N.
+--mode auto runs a per-series model tournament: cheap vectorized models first,
+GBoost only where they fit poorly, under a time budget.
 """
 import os
 import sys
 import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
+from forecast_cache import code_version, cache_key, cache_get, cache_put
+from model_registry import ModelRegistry
+from ine_csv import read_ine_csv
+from model_tournament import run_tournament, holdout_size, cv_scores, HOLDOUT, THRESHOLD, BUDGET
 from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import TimeSeriesSplit
@@ -19,6 +29,21 @@ WORKDIR = os.path.dirname(__file__)
 CURRENT_YEAR = 2025
 TARGET_YEARS = [CURRENT_YEAR + 1, CURRENT_YEAR + 3, CURRENT_YEAR + 5]
 
+FEATURE_COLS = ['year_norm', 'value_lag1', 'value_lag2', 'growth_1y',
+                'growth_2y', 'roll_mean_2y', 'roll_std_2y', 'ewm_mean']
+# Last create_features row of a series = state the recursive forecast starts from
+STATE_COLS = ['value'] + FEATURE_COLS
+EWM_ALPHA = 2 / (2 + 1)  # ewm(span=2, adjust=False)
+# Series-level descriptors added to the features in global mode
+SERIES_COLS = ['series_log_level', 'series_mean', 'series_std', 'series_slope']
+GBR_PARAMS = dict(n_estimators=100, learning_rate=0.1, max_depth=3, random_state=42)
+# Panel rows the global model is fitted on (a sample of whole series). This is a
+# fit size, not a run-time limit: building the panel, validating and predicting
+# stay linear in the number of series
+GLOBAL_FIT_ROWS = 20000
+CACHE_DIR = os.path.join(WORKDIR, '.forecast_cache')
+REGISTRY_DIR = os.path.join(WORKDIR, 'model_registry')
+
 def create_features(years, values):
     """Create time series features from year/value pairs."""
     df = pd.DataFrame({'year': years, 'value': values})
@@ -47,27 +72,103 @@ def create_features(years, values):
     
     return df
 
-def train_and_predict(years, values, target_years):
-    """Train GBoost model and predict target years."""
+def panel_features(data, years=None):
+    """create_features for many series in one vectorized pass.
+
+    `data` is either a long frame with columns series, year, value (series may
+    cover different years) or a 2-D array (n_series, n_years) of values for
+    the common `years`. The same pandas shift/pct_change/rolling/ewm kernels
+    run once over the whole panel, so FEATURE_COLS are bit-identical to
+    create_features series by series. Unlike create_features, missing values
+    are left as NaN in the 'value' column. Returns a long frame sorted by
+    series and year.
+    """
+    if years is not None:
+        # Wide panel: one column per series, kernels run column-wise
+        years = np.asarray(years)
+        order = np.argsort(years, kind='stable')
+        years = years[order]
+        W = pd.DataFrame(np.atleast_2d(np.asarray(data, dtype=float))[:, order].T)
+        n_series, n_years = W.shape[1], W.shape[0]
+        feats = {
+            'value_lag1': W.shift(1),
+            'value_lag2': W.shift(2),
+            'growth_1y': W.pct_change(),
+            'growth_2y': W.pct_change(periods=2),
+            'roll_mean_2y': W.rolling(window=2, min_periods=1).mean(),
+            'roll_std_2y': W.rolling(window=2, min_periods=1).std(),
+            'ewm_mean': W.ewm(span=2, adjust=False).mean(),
+        }
+        panel = pd.DataFrame({
+            'series': np.repeat(np.arange(n_series), n_years),
+            'year': np.tile(years, n_series),
+            'value': W.to_numpy().T.ravel(),
+        })
+        year_norm = (pd.Series(years) - years.min()) / (years.max() - years.min())
+        panel['year_norm'] = np.tile(year_norm.to_numpy(), n_series)
+        for name, frame in feats.items():
+            panel[name] = frame.to_numpy().T.ravel()
+    else:
+        # Long panel: grouped kernels, series may have different years
+        panel = data[['series', 'year', 'value']].sort_values(['series', 'year'], kind='stable')
+        panel = panel.reset_index(drop=True)
+        g = panel.groupby('series', sort=False)
+        v = g['value']
+        year_min, year_max = g['year'].transform('min'), g['year'].transform('max')
+        panel['year_norm'] = (panel['year'] - year_min) / (year_max - year_min)
+        panel['value_lag1'] = v.shift(1)
+        panel['value_lag2'] = v.shift(2)
+        panel['growth_1y'] = v.pct_change()
+        panel['growth_2y'] = v.pct_change(periods=2)
+        panel['roll_mean_2y'] = v.rolling(window=2, min_periods=1).mean().reset_index(level=0, drop=True)
+        panel['roll_std_2y'] = v.rolling(window=2, min_periods=1).std().reset_index(level=0, drop=True)
+        panel['ewm_mean'] = v.ewm(span=2, adjust=False).mean().reset_index(level=0, drop=True)
+    
+    # Fill NaN with 0 for initial periods
+    panel[FEATURE_COLS] = panel[FEATURE_COLS].fillna(0)
+    return panel
+
+def local_features(series):
+    """create_features of every (years, values) series from one panel_features pass.
+
+    Returns one frame per series, in input order, with the same rows and
+    values as create_features(years, values) (missing values read as 0).
+    """
+    if not series:
+        return []
+    years_list = [np.asarray(years) for years, _ in series]
+    vals_list = [np.asarray(vals, dtype=float) for _, vals in series]
+    if all(np.array_equal(years_list[0], y) for y in years_list):
+        panel = panel_features(np.vstack(vals_list), years_list[0])
+    else:
+        panel = panel_features(pd.DataFrame({
+            'series': np.repeat(np.arange(len(series)), [len(y) for y in years_list]),
+            'year': np.concatenate(years_list),
+            'value': np.concatenate(vals_list),
+        }))
+    panel['value'] = panel['value'].fillna(0)
+    bounds = np.cumsum([0] + [len(y) for y in years_list])
+    return [panel.iloc[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+def train_and_predict(years, values, target_years, features=None):
+    """Train GBoost model and predict target years.
+
+    `features` is the series' create_features frame when it was already
+    built for a batch (local_features).
+    """
     if len(years) < 3:
         return {t: np.nan for t in target_years}, np.nan, None
     
     # Create features
-    df = create_features(years, values)
+    df = create_features(years, values) if features is None else features
     
     # Prepare X/y
-    feature_cols = ['year_norm', 'value_lag1', 'value_lag2', 'growth_1y', 
-                   'growth_2y', 'roll_mean_2y', 'roll_std_2y', 'ewm_mean']
+    feature_cols = FEATURE_COLS
     X = df[feature_cols].values
     y = df['value'].values
     
     # Configure model
-    model = GradientBoostingRegressor(
-        n_estimators=100,
-        learning_rate=0.1,
-        max_depth=3,
-        random_state=42
-    )
+    model = GradientBoostingRegressor(**GBR_PARAMS)
     
     # Time series CV
     tscv = TimeSeriesSplit(n_splits=3)
@@ -84,41 +185,359 @@ def train_and_predict(years, values, target_years):
     # Fit on all data
     model.fit(X, y)
     
-    # Prepare features for future years
-    future_years = pd.DataFrame({'year': target_years})
-    future_years['year_norm'] = (future_years['year'] - df['year'].min()) / (df['year'].max() - df['year'].min())
-    
-    # Use last known values for lags
-    last_value = df['value'].iloc[-1]
-    last_growth = df['growth_1y'].iloc[-1]
-    
-    predictions = {}
-    for year in target_years:
-        idx = future_years['year'] == year
-        X_future = np.zeros((1, len(feature_cols)))
-        X_future[0, 0] = future_years.loc[idx, 'year_norm'].iloc[0]  # year_norm
-        X_future[0, 1] = last_value  # value_lag1
-        X_future[0, 2] = df['value'].iloc[-2] if len(df) > 2 else last_value  # value_lag2
-        X_future[0, 3] = last_growth  # growth_1y
-        X_future[0, 4] = df['growth_2y'].iloc[-1]  # growth_2y
-        X_future[0, 5] = df['roll_mean_2y'].iloc[-1]  # roll_mean_2y
-        X_future[0, 6] = df['roll_std_2y'].iloc[-1]  # roll_std_2y
-        X_future[0, 7] = df['ewm_mean'].iloc[-1]  # ewm_mean
-        
-        pred = model.predict(X_future)[0]
-        predictions[year] = float(pred)
-        # Update for next year
-        last_value = pred
-        last_growth = (pred - last_value) / last_value if last_value != 0 else 0
+    # Recursive forecast from the last observed row
+    last = df[STATE_COLS].values[-1:]
+    preds = recursive_forecast(model.predict, last, df['year'].min(), df['year'].max(), target_years)
+    predictions = {t: float(preds[t][0]) for t in target_years}
     
     cv_score = np.mean(cv_scores)
     feature_importance = dict(zip(feature_cols, model.feature_importances_))
     
     return predictions, cv_score, feature_importance
 
-def forecast_alquiler(path):
+def gboost_holdout_fit(years, values, target_years, features=None, holdout=HOLDOUT):
+    """GBoost candidate for the model tournament.
+
+    Each of the last `holdout` years is forecast recursively from the state
+    of the year before, by a model fitted on the features of the earlier
+    years only (as backtest.py does), so the holdout value never enters its
+    own prediction. Then refitted on all rows and forecast recursively.
+    `features` is as in train_and_predict.
+    Returns (predictions, cv_mape, cv_r2, feature_importance).
+    """
+    df = create_features(years, values) if features is None else features
+    X, y = df[FEATURE_COLS].values, df['value'].values
+    model = GradientBoostingRegressor(**GBR_PARAMS)
+    
+    k = holdout_size(len(df), holdout)
+    cv_pred = np.full(k, np.nan)
+    for j, cut in enumerate(range(len(df) - k, len(df))):
+        win = _window(df, cut)
+        model.fit(win[FEATURE_COLS].values, win['value'].values)
+        year = df['year'].iloc[cut]
+        pred = recursive_forecast(model.predict, win[STATE_COLS].values[-1:], win['year'].iloc[0],
+                                  win['year'].iloc[-1], [year])
+        cv_pred[j] = pred[year][0]
+    if k:
+        mape, r2 = cv_scores(y[None, -k:], cv_pred[None])
+        mape, r2 = mape[0], r2[0]
+    else:
+        mape, r2 = np.inf, np.nan
+    
+    model.fit(X, y)
+    preds = recursive_forecast(model.predict, df[STATE_COLS].values[-1:], df['year'].min(), df['year'].max(),
+                               target_years)
+    predictions = {t: float(preds[t][0]) for t in target_years}
+    return predictions, mape, r2, dict(zip(FEATURE_COLS, model.feature_importances_))
+
+def _window(df, n):
+    """First n rows of a create_features frame, as create_features builds them from those years alone.
+
+    Every feature but year_norm only looks backwards, so only year_norm is
+    rescaled to the shorter span.
+    """
+    win = df.iloc[:n].copy()
+    first, last = win['year'].iloc[0], win['year'].iloc[-1]
+    win['year_norm'] = (win['year'] - first) / (last - first)
+    return win
+
+def _safe_growth(new, old):
+    """new / old - 1, with 0 where old is 0."""
+    return np.divide(new - old, old, out=np.zeros_like(new), where=old != 0)
+
+def recursive_forecast(predict, last, year_min, year_max, target_years, static=None):
+    """Recursive yearly forecast for a batch of series, up to max(target_years).
+
+    `last` is the last create_features row of each series, shape (n, len(STATE_COLS)).
+    Each year after year_max builds the 8 features of every series as one
+    array and calls `predict` once. The prediction then rolls the lags, growth
+    rates, rolling mean/std and EWM forward. `static` columns (n, k) are
+    appended unchanged to every step. Returns {target_year: (n,) array}; a
+    target year equal to a series' year_max gives its observed value, an
+    earlier one gives NaN (nothing is forecast inside the history).
+    """
+    last = np.atleast_2d(np.asarray(last, dtype=float))
+    col = {name: last[:, i].copy() for i, name in enumerate(STATE_COLS)}
+    v1, v2, v3 = col['value'], col['value_lag1'], col['value_lag2']
+    g1, g2 = col['growth_1y'], col['growth_2y']
+    rm, rs, ewm = col['roll_mean_2y'], col['roll_std_2y'], col['ewm_mean']
+    
+    n = len(last)
+    year_min = np.broadcast_to(np.asarray(year_min, dtype=float), (n,))
+    year_max = np.broadcast_to(np.asarray(year_max, dtype=float), (n,))
+    observed = v1.copy()
+    span = np.where(year_max > year_min, year_max - year_min, 1.0)
+    
+    X = np.zeros((n, len(FEATURE_COLS) + (0 if static is None else static.shape[1])))
+    if static is not None:
+        X[:, len(FEATURE_COLS):] = static
+    
+    out = {}
+    for year in range(int(year_max.min()) + 1, int(max(target_years)) + 1):
+        X[:, 0] = (year - year_min) / span
+        X[:, 1], X[:, 2], X[:, 3], X[:, 4] = v1, v2, g1, g2
+        X[:, 5], X[:, 6], X[:, 7] = rm, rs, ewm
+        pred = np.asarray(predict(X), dtype=float)
+        
+        # Roll the state forward only for series already past their last observation
+        step = year > year_max
+        v3 = np.where(step, v2, v3)
+        v2 = np.where(step, v1, v2)
+        v1 = np.where(step, pred, v1)
+        g1 = np.where(step, _safe_growth(v1, v2), g1)
+        g2 = np.where(step, _safe_growth(v1, v3), g2)
+        rm = np.where(step, (v1 + v2) / 2, rm)
+        rs = np.where(step, np.abs(v1 - v2) / np.sqrt(2), rs)
+        ewm = np.where(step, EWM_ALPHA * v1 + (1 - EWM_ALPHA) * ewm, ewm)
+        if year in target_years:
+            out[year] = np.where(year >= year_max, v1, np.nan)
+    for t in target_years:
+        if t not in out:
+            # Horizons at or before the first series' last observed year
+            out[t] = np.where(t == year_max, observed, np.nan)
+    return out
+
+def _predict_chunk(chunk, target_years):
+    """Run train_and_predict on a chunk of (years, values, features) series in a worker."""
+    t0 = time.perf_counter()
+    results = [train_and_predict(years, vals, target_years, feats) for years, vals, feats in chunk]
+    return os.getpid(), len(chunk), time.perf_counter() - t0, results
+
+def predict_series(series, target_years, workers=1, mode='local', cache=True,
+                   fit_rows=GLOBAL_FIT_ROWS, name='panel', ids=None,
+                   budget=BUDGET, threshold=THRESHOLD):
+    """Forecast a list of (years, values) pairs, reusing cached results.
+
+    mode='local' fits one model per series (train_and_predict); with
+    cache=True results are looked up in CACHE_DIR by a hash of the series,
+    target years, hyperparameters and model code, so only new or changed
+    series are refitted.
+    mode='global' fits one pooled model for all series and ignores workers.
+    The fitted model is stored in the model registry as gboost_<name>_global
+    and reused for any target years while the training data hash is unchanged.
+    `ids` (one per series) are kept with it for the forecast service.
+    mode='auto' runs the model tournament (see model_tournament): GBoost is
+    only fitted for series whose cheap-model CV MAPE exceeds `threshold`,
+    within `budget` seconds. Its results carry a fourth element
+    {'model', 'cv_mape'} with the chosen model, and r2 is the holdout r2.
+    """
+    if mode == 'auto':
+        return run_tournament(series, target_years, gboost_holdout_fit, threshold, budget, workers,
+                              prepare=local_features)
+    
+    if mode == 'global':
+        registry = ModelRegistry(REGISTRY_DIR)
+        reg_name = f'gboost_{name}_global'
+        version = code_version(panel_features, _series_panel, _with_descriptors, fit_global_model)
+        data_hash = cache_key(version, GBR_PARAMS, FEATURE_COLS, SERIES_COLS, fit_rows,
+                              *[part for years, vals in series for part in (years, vals)])
+        entry = registry.lookup(reg_name, data_hash) if cache else None
+        if entry is None:
+            model, state = fit_global_model(series, fit_rows)
+            if model is None:
+                return [({t: np.nan for t in target_years}, np.nan, None) for _ in series]
+            state['ids'] = None if ids is None else [str(i) for i in ids]
+            entry = registry.save(reg_name, model, data_hash, params=GBR_PARAMS,
+                                  metrics={'cv_r2_mean': float(np.nanmean(state['r2'])),
+                                           'n_series': len(series)},
+                                  features=FEATURE_COLS + SERIES_COLS, state=state)
+            print(f'  global model saved to registry as {reg_name}')
+        else:
+            print(f'  global model {reg_name} loaded from registry (data unchanged)')
+        return forecast_global(entry.model, entry.state, target_years)
+    
+    if not cache:
+        return _fit_series(series, target_years, workers)
+    
+    version = code_version(local_features, panel_features, train_and_predict, recursive_forecast, _safe_growth)
+    keys = [cache_key('local', version, GBR_PARAMS, FEATURE_COLS, target_years, years, vals)
+            for years, vals in series]
+    results = [cache_get(CACHE_DIR, k) for k in keys]
+    todo = [i for i, r in enumerate(results) if r is None]
+    if todo:
+        fitted = _fit_series([series[i] for i in todo], target_years, workers)
+        for i, r in zip(todo, fitted):
+            results[i] = r
+            cache_put(CACHE_DIR, keys[i], r)
+    print(f'  cache: {len(series) - len(todo)} series reused, {len(todo)} fitted')
+    return results
+
+def _fit_series(series, target_years, workers=1):
+    """Run train_and_predict over a list of (years, values) pairs.
+
+    The features of all series are built in one local_features pass. With
+    workers > 1 the series are split into chunks and fitted in a process
+    pool. Results are returned in input order, so output is identical to the
+    serial run.
+    """
+    inputs = [(years, vals, feats) for (years, vals), feats in zip(series, local_features(series))]
+    if workers <= 1 or len(series) < 2:
+        return [train_and_predict(years, vals, target_years, feats) for years, vals, feats in inputs]
+    
+    chunksize = max(1, math.ceil(len(series) / (workers * 4)))
+    chunks = [inputs[i:i + chunksize] for i in range(0, len(inputs), chunksize)]
+    
+    results = []
+    timing = {}
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for pid, n, elapsed, chunk_results in pool.map(_predict_chunk, chunks, [target_years] * len(chunks)):
+            results.extend(chunk_results)
+            stats = timing.setdefault(pid, [0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += n
+            stats[2] += elapsed
+    
+    print(f'  {len(series)} series in {len(chunks)} chunks, {workers} workers, {time.perf_counter() - t0:.2f}s wall')
+    for pid, (n_chunks, n_series, elapsed) in sorted(timing.items()):
+        print(f'    worker {pid}: {n_chunks} chunks, {n_series} series, {elapsed:.2f}s')
+    return results
+
+def _series_panel(series):
+    """Stack the features of every series into one long frame (panel_features).
+
+    Values are divided by the first observation of each series so that rents,
+    incomes and populations share one scale. Series with fewer than 3 points
+    are left out, as in train_and_predict.
+    """
+    scales = np.full(len(series), np.nan)
+    kept, years_list, vals_list = [], [], []
+    for sid, (years, vals) in enumerate(series):
+        if len(years) < 3:
+            continue
+        vals = np.asarray(vals, dtype=float)
+        observed = vals[~np.isnan(vals)]
+        scales[sid] = abs(observed[0]) if len(observed) and observed[0] != 0 else 1.0
+        kept.append(sid)
+        years_list.append(np.asarray(years))
+        vals_list.append(vals / scales[sid])
+    if not kept:
+        return pd.DataFrame(), scales
+    
+    kept = np.asarray(kept)
+    if all(np.array_equal(years_list[0], y) for y in years_list):
+        panel = panel_features(np.vstack(vals_list), years_list[0])
+        panel['series'] = kept[panel['series'].to_numpy()]
+    else:
+        long = pd.DataFrame({
+            'series': np.repeat(kept, [len(y) for y in years_list]),
+            'year': np.concatenate(years_list),
+            'value': np.concatenate(vals_list),
+        })
+        panel = panel_features(long)
+    panel['series_log_level'] = np.log10(scales[panel['series'].to_numpy()])
+    return panel, scales
+
+def _with_descriptors(panel, cutoff=None):
+    """Add per-series mean/std/slope computed on the years up to `cutoff`."""
+    win = panel if cutoff is None else panel[panel['year'] <= cutoff]
+    g = win.groupby('series')
+    yc = win['year'] - g['year'].transform('mean')
+    vc = win['value'] - g['value'].transform('mean')
+    desc = pd.DataFrame({
+        'series_mean': g['value'].mean(),
+        'series_std': g['value'].std(),
+        'series_slope': (yc * vc).groupby(win['series']).sum() / (yc ** 2).groupby(win['series']).sum(),
+    })
+    out = panel.drop(columns=[c for c in desc.columns if c in panel.columns]).join(desc, on='series')
+    out[desc.columns] = out[desc.columns].fillna(0)
+    return out
+
+def fit_global_model(series, fit_rows=GLOBAL_FIT_ROWS):
+    """Train one pooled GBoost model on all series.
+
+    The panel of all series is stacked in long format with the create_features
+    columns plus series-level descriptors, so the number of fits does not grow
+    with the number of series (3 CV folds over years plus the final fit).
+    If the panel has more than `fit_rows` rows, the model is fitted on a fixed
+    random subset of whole series, which caps the cost of the fits; every
+    series is still validated and predicted, so the total run time keeps
+    growing linearly with the number of series.
+    Returns (model, state), where state holds what forecast_global needs to
+    forecast any horizon (last rows, descriptors, year spans, scales) plus the
+    per-series CV r2 and feature importances; (None, None) if no series has
+    enough points.
+    """
+    panel, scales = _series_panel(series)
+    if panel.empty:
+        return None, None
+    panel = panel[panel['value'].notna()].reset_index(drop=True)
+    cols = FEATURE_COLS + SERIES_COLS
+    model = GradientBoostingRegressor(**GBR_PARAMS)
+    
+    in_fit = np.ones(len(panel), dtype=bool)
+    if fit_rows and len(panel) > fit_rows:
+        ids = panel['series'].unique()
+        n_fit = max(1, int(len(ids) * fit_rows / len(panel)))
+        fit_ids = np.random.default_rng(42).choice(ids, n_fit, replace=False)
+        in_fit = panel['series'].isin(fit_ids).values
+    
+    # Time series CV over calendar years shared by the whole panel
+    all_years = np.sort(panel['year'].unique())
+    fold_scores = []
+    for train_idx, val_idx in TimeSeriesSplit(n_splits=3).split(all_years):
+        cutoff = all_years[train_idx[-1]]
+        fold = _with_descriptors(panel, cutoff)
+        train = fold[(fold['year'] <= cutoff) & in_fit]
+        val = fold[fold['year'].isin(all_years[val_idx])]
+        model.fit(train[cols].values, train['value'].values)
+        err = pd.DataFrame({
+            'series': val['series'].values,
+            'y': val['value'].values,
+            'res': val['value'].values - model.predict(val[cols].values),
+        })
+        # r2 per series (scale-free, so it is computed on normalised values)
+        err['dev'] = err['y'] - err.groupby('series')['y'].transform('mean')
+        ss = err.groupby('series')[['res', 'dev']].agg(lambda v: (v ** 2).sum())
+        r2 = 1 - ss['res'] / ss['dev']
+        r2[ss['dev'] == 0] = np.where(ss['res'][ss['dev'] == 0] == 0, 1.0, 0.0)
+        fold_scores.append(r2)
+    cv = pd.concat(fold_scores, axis=1).mean(axis=1)
+    
+    # Fit on all data
+    panel = _with_descriptors(panel)
+    model.fit(panel.loc[in_fit, cols].values, panel.loc[in_fit, 'value'].values)
+    
+    last = panel.groupby('series').tail(1).set_index('series')
+    span = panel.groupby('series')['year'].agg(['min', 'max']).loc[last.index]
+    state = {
+        'n_series': len(series),
+        'series': last.index.to_numpy(),
+        'last': last[STATE_COLS].to_numpy(),
+        'static': last[SERIES_COLS].to_numpy(),
+        'year_min': span['min'].to_numpy(),
+        'year_max': span['max'].to_numpy(),
+        'scale': scales[last.index],
+        'r2': cv.reindex(last.index).to_numpy(),
+        'importance': dict(zip(FEATURE_COLS, model.feature_importances_[:len(FEATURE_COLS)])),
+    }
+    return model, state
+
+def forecast_global(model, state, target_years):
+    """Recursive forecast of every series in a fitted global model.
+
+    Returns the same (predictions, r2, feature_importance) tuple per series as
+    train_and_predict, in input order.
+    """
+    scaled = recursive_forecast(model.predict, state['last'], state['year_min'], state['year_max'],
+                                target_years, static=state['static'])
+    out = [({t: np.nan for t in target_years}, np.nan, None)] * state['n_series']
+    for i, sid in enumerate(state['series']):
+        preds = {t: float(scaled[t][i] * state['scale'][i]) for t in target_years}
+        out[sid] = (preds, state['r2'][i], state['importance'])
+    return out
+
+def train_and_predict_global(series, target_years, fit_rows=GLOBAL_FIT_ROWS):
+    """Fit the global model and forecast target years (no registry)."""
+    model, state = fit_global_model(series, fit_rows)
+    if model is None:
+        return [({t: np.nan for t in target_years}, np.nan, None) for _ in series]
+    return forecast_global(model, state, target_years)
+
+def forecast_alquiler(path, workers=1, mode='local', cache=True, target_years=TARGET_YEARS,
+                      budget=BUDGET, threshold=THRESHOLD):
     """Forecast rent prices using GBoost."""
-    df = pd.read_csv(path, sep=';', encoding='utf-8')
+    df = read_ine_csv(path)
     years = []
     for c in df.columns:
         if c.lower().startswith('precio_'):
@@ -132,17 +551,23 @@ def forecast_alquiler(path):
     out_rows = []
     importances = []
     
-    for _, row in df.iterrows():
+    series = [(years, [row.get(f'Precio_{y}', np.nan) for y in years]) for _, row in df.iterrows()]
+    results = predict_series(series, target_years, workers, mode, cache,
+                             name='alquiler', ids=df['Localización'].tolist(),
+                             budget=budget, threshold=threshold)
+    
+    for (_, row), (preds, r2, feat_imp, *choice) in zip(df.iterrows(), results):
         loc = row['Localización']
-        vals = [row.get(f'Precio_{y}', np.nan) for y in years]
-        preds, r2, feat_imp = train_and_predict(years, vals, TARGET_YEARS)
         
         out = {'Localizacion': loc, 'last_year': max(years)}
         for y in years:
             out[f'val_{y}'] = row.get(f'Precio_{y}', np.nan)
-        for t in TARGET_YEARS:
+        for t in target_years:
             out[f'pred_{t}'] = preds[t]
         out['r2'] = r2
+        if choice:
+            # mode auto: model chosen by the tournament and its CV error
+            out.update(choice[0])
         out_rows.append(out)
         
         if feat_imp:
@@ -161,31 +586,35 @@ def forecast_alquiler(path):
     print('Saved alquiler_predictions_gboost.csv and alquiler_feature_importance.csv')
     return out_df
 
-def forecast_renta(path):
+def forecast_renta(path, workers=1, mode='local', cache=True, target_years=TARGET_YEARS,
+                   budget=BUDGET, threshold=THRESHOLD):
     """Forecast income using GBoost."""
-    df = pd.read_csv(path, sep=';', encoding='utf-8', engine='python')
-    df = df.rename(columns=lambda s: s.strip())
+    df = read_ine_csv(path, numeric=['Total'])
     dfp = df[df['Provincias'].notna()].copy()
-    dfp['Total_num'] = pd.to_numeric(dfp['Total'].astype(str).str.replace(',', '.'), errors='coerce')
+    dfp['Total_num'] = dfp['Total']
     dfp['Periodo'] = pd.to_numeric(dfp['Periodo'], errors='coerce')
     
-    groups = dfp.groupby('Provincias')
+    groups = []
+    for prov, g in dfp.groupby('Provincias'):
+        g_sorted = g.sort_values('Periodo')
+        groups.append((prov, g_sorted['Periodo'].astype(int).tolist(), g_sorted['Total_num'].tolist()))
+    
+    results = predict_series([(years, vals) for _, years, vals in groups], target_years, workers, mode, cache,
+                             name='renta', ids=[prov for prov, _, _ in groups],
+                             budget=budget, threshold=threshold)
     out_rows = []
     importances = []
     
-    for prov, g in groups:
-        g_sorted = g.sort_values('Periodo')
-        years = g_sorted['Periodo'].astype(int).tolist()
-        vals = g_sorted['Total_num'].tolist()
-        
-        preds, r2, feat_imp = train_and_predict(years, vals, TARGET_YEARS)
-        
+    for (prov, years, vals), (preds, r2, feat_imp, *choice) in zip(groups, results):
         out = {'Provincia': prov, 'last_year': int(max(years))}
         for y, v in zip(years, vals):
             out[f'val_{y}'] = v
-        for t in TARGET_YEARS:
+        for t in target_years:
             out[f'pred_{t}'] = preds[t]
         out['r2'] = r2
+        if choice:
+            # mode auto: model chosen by the tournament and its CV error
+            out.update(choice[0])
         out_rows.append(out)
         
         if feat_imp:
@@ -203,10 +632,11 @@ def forecast_renta(path):
     print('Saved renta_predictions_gboost.csv and renta_feature_importance.csv')
     return out_df
 
-def forecast_population(path):
+def forecast_population(path, workers=1, mode='local', cache=True, target_years=TARGET_YEARS,
+                        budget=BUDGET, threshold=THRESHOLD):
     """Forecast population using GBoost (province level)."""
-    df = pd.read_csv(path, sep=';', encoding='utf-8', engine='python')
-    df.columns = [c.strip('\ufeff').strip() for c in df.columns]
+    # '.' is the thousands separator in the INE population exports
+    df = read_ine_csv(path, numeric=['Total'], thousands='.')
     
     def prov_code(m):
         if pd.isna(m):
@@ -220,29 +650,34 @@ def forecast_population(path):
     
     df['PROV'] = df[df.columns[0]].apply(prov_code)
     df['Periodo'] = pd.to_numeric(df['Periodo'], errors='coerce')
-    df['Total_num'] = pd.to_numeric(df['Total'].astype(str).str.replace('.', '').replace('', np.nan), errors='coerce')
+    df['Total_num'] = df['Total']
     
     # Keep years >= 2000 and aggregate by province
     df2 = df[(df['Periodo'] >= 2000) & (df['Periodo'] <= CURRENT_YEAR) & (df['Sexo'] == 'Total')]
     groups = df2.groupby(['PROV','Periodo'])['Total_num'].sum().reset_index()
     
     provs = groups['PROV'].unique()
+    series = []
+    for prov in provs:
+        g = groups[groups['PROV'] == prov].sort_values('Periodo')
+        series.append((g['Periodo'].astype(int).tolist(), g['Total_num'].tolist()))
+    
+    results = predict_series(series, target_years, workers, mode, cache,
+                             name='poblacion_prov', ids=list(provs),
+                             budget=budget, threshold=threshold)
     out_rows = []
     importances = []
     
-    for prov in provs:
-        g = groups[groups['PROV'] == prov].sort_values('Periodo')
-        years = g['Periodo'].astype(int).tolist()
-        vals = g['Total_num'].tolist()
-        
-        preds, r2, feat_imp = train_and_predict(years, vals, TARGET_YEARS)
-        
+    for prov, (years, vals), (preds, r2, feat_imp, *choice) in zip(provs, series, results):
         out = {'PROV': prov, 'last_year': int(max(years))}
         for y, v in zip(years, vals):
             out[f'val_{y}'] = v
-        for t in TARGET_YEARS:
+        for t in target_years:
             out[f'pred_{t}'] = preds[t]
         out['r2'] = r2
+        if choice:
+            # mode auto: model chosen by the tournament and its CV error
+            out.update(choice[0])
         out_rows.append(out)
         
         if feat_imp:
@@ -260,6 +695,66 @@ def forecast_population(path):
     print('Saved poblacion_predictions_prov_gboost.csv and poblacion_feature_importance.csv')
     return out_df
 
+def load_population_municipal(path):
+    """Municipality x year population matrix from the INE export (Sexo == 'Total')."""
+    # '.' is the thousands separator in the INE population exports
+    df = read_ine_csv(path, numeric=['Total'], thousands='.')
+    
+    muni = df[df.columns[0]].astype(str).str.strip().str.split(n=1)
+    df['Codigo'] = muni.str[0]
+    df['Municipio'] = muni.str[1]
+    df['Periodo'] = pd.to_numeric(df['Periodo'], errors='coerce')
+    df['Total_num'] = df['Total']
+    
+    # Only 5-digit INE municipality codes (drops national/province totals)
+    df = df[(df['Periodo'] >= 2000) & (df['Periodo'] <= CURRENT_YEAR) & (df['Sexo'] == 'Total')
+            & df['Codigo'].str.fullmatch(r'\d{5}')]
+    wide = df.pivot_table(index=['Codigo', 'Municipio'], columns='Periodo', values='Total_num', aggfunc='first')
+    wide.columns = [int(c) for c in wide.columns]
+    return wide.sort_index(axis=1)
+
+def forecast_population_municipal(path, fit_rows=GLOBAL_FIT_ROWS, cache=True, target_years=TARGET_YEARS):
+    """Forecast population for every municipality with the global GBoost model.
+
+    Per-series fitting is far too slow for ~8,100 municipalities, so this level
+    always uses train_and_predict_global with a capped training panel (the
+    cap bounds the fit, not the validation and prediction over every series).
+    """
+    t0 = time.perf_counter()
+    wide = load_population_municipal(path)
+    years = list(wide.columns)
+    series = [(years, vals) for vals in wide.to_numpy(dtype=float)]
+    results = predict_series(series, target_years, mode='global', cache=cache, fit_rows=fit_rows,
+                             name='poblacion_muni', ids=wide.index.get_level_values('Codigo'))
+    
+    out_df = wide.reset_index()
+    out_df.columns = ['Codigo', 'Municipio'] + [f'val_{y}' for y in years]
+    out_df.insert(2, 'last_year', max(years))
+    for t in target_years:
+        out_df[f'pred_{t}'] = [preds[t] for preds, _, _ in results]
+    out_df['r2'] = [r2 for _, r2, _ in results]
+    out_df.to_csv(os.path.join(WORKDIR, 'poblacion_predictions_muni_gboost.csv'), index=False)
+    
+    feat_imp = next((imp for _, _, imp in results if imp), None)
+    if feat_imp:
+        imp_df = pd.DataFrame([dict(model='global', **feat_imp)])
+        imp_df.to_csv(os.path.join(WORKDIR, 'poblacion_muni_feature_importance.csv'), index=False)
+    
+    print(f'{len(series)} municipalities x {len(years)} years forecast in {time.perf_counter() - t0:.1f}s')
+    print('Saved poblacion_predictions_muni_gboost.csv and poblacion_muni_feature_importance.csv')
+    return out_df
+
+def parse_horizons(tokens):
+    """Target years from CLI tokens such as ['2026', '2028'] or ['2024-2040']."""
+    years = set()
+    for tok in tokens:
+        if '-' in tok:
+            a, b = tok.split('-')
+            years.update(range(int(a), int(b) + 1))
+        else:
+            years.add(int(tok))
+    return sorted(years)
+
 def merge_predictions(alq_df, renta_df, pop_df):
     """Merge predictions from different models."""
     renta_keys = renta_df['Provincia'].tolist()
@@ -306,30 +801,56 @@ def merge_predictions(alq_df, renta_df, pop_df):
     return merged_df
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Forecast rent, income and population with GBoost.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes (1 = serial)')
+    parser.add_argument('--mode', choices=['local', 'global', 'auto'], default='local',
+                        help='local: one model per series; global: one pooled model for all series; '
+                             'auto: cheap models first, GBoost only where they fit poorly')
+    parser.add_argument('--budget', type=float, default=BUDGET,
+                        help='seconds of GBoost fits allowed in auto mode')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='cheap-model CV MAPE above which auto mode tries GBoost')
+    parser.add_argument('--pop-level', choices=['prov', 'muni'], default='prov',
+                        help='population forecast by province or by municipality (always global)')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='refit everything instead of reusing cached forecasts or registered models')
+    parser.add_argument('--horizons', nargs='+', default=[str(t) for t in TARGET_YEARS],
+                        help='target years, e.g. 2026 2028 2030 or 2024-2040')
+    args = parser.parse_args()
+    target_years = parse_horizons(args.horizons)
+    
     base = WORKDIR
     alquiler_path = os.path.join(base, 'alquiler_precios_unido_imputed.csv')
     renta_path = os.path.join(base, 'evolucion_renta.csv')
     poblacion_path = os.path.join(base, 'evolucion_poblacion.csv')
     
     if os.path.exists(alquiler_path):
-        alq = forecast_alquiler(alquiler_path)
+        alq = forecast_alquiler(alquiler_path, args.workers, args.mode, args.cache, target_years,
+                                args.budget, args.threshold)
     else:
         print('alquiler file not found:', alquiler_path)
         alq = pd.DataFrame()
     
     if os.path.exists(renta_path):
-        ren = forecast_renta(renta_path)
+        ren = forecast_renta(renta_path, args.workers, args.mode, args.cache, target_years,
+                             args.budget, args.threshold)
     else:
         print('renta file not found:', renta_path)
         ren = pd.DataFrame()
     
     if os.path.exists(poblacion_path):
-        pop = forecast_population(poblacion_path)
+        if args.pop_level == 'muni':
+            pop = forecast_population_municipal(poblacion_path, cache=args.cache, target_years=target_years)
+        else:
+            pop = forecast_population(poblacion_path, args.workers, args.mode, args.cache, target_years,
+                                      args.budget, args.threshold)
     else:
         print('poblacion file not found:', poblacion_path)
         pop = pd.DataFrame()
     
-    if not alq.empty and not ren.empty:
+    # merge_predictions reports the 2026/2028/2030 horizons
+    if not alq.empty and not ren.empty and set(TARGET_YEARS) <= set(target_years):
         merge_predictions(alq, ren, pop)
     
     print('Done')
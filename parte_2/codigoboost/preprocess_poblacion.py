@@ -1,35 +1,119 @@
 """
 Preprocess population data file to convert it to the right format.
+--chunksize N streams evolucion_poblacion.csv in blocks of N rows: each block
+is filtered (Sexo == 'Total') and scattered into a municipality x year array,
+so memory stays bounded by the block size plus the wide result, whatever the
+size of the INE table (all years since 1996, three sexes). Same output as the
+in-memory pivot. --columnar also writes the wide table in columnar form.
 """
+import argparse
+import numpy as np
 import pandas as pd
+from ine_csv import read_ine_csv, iter_ine_csv, HAS_ARROW
+from csv_cache import write_columns
 
-# Read the data - try different encodings
-try:
-    df = pd.read_csv('evolucion_poblacion.csv', sep=';', encoding='utf-8')
-except UnicodeDecodeError:
-    try:
-        df = pd.read_csv('evolucion_poblacion.csv', sep=';', encoding='latin1')
-    except UnicodeDecodeError:
-        df = pd.read_csv('evolucion_poblacion.csv', sep=';', encoding='cp1252')
+parser = argparse.ArgumentParser(description='Tabla ancha municipio x año de evolucion_poblacion.csv.')
+parser.add_argument('--input', default='evolucion_poblacion.csv')
+parser.add_argument('--output', default='evolucion_poblacion_wide.csv')
+parser.add_argument('--chunksize', type=int, default=0,
+                    help='filas por bloque en modo streaming (0 = cargar todo en memoria)')
+parser.add_argument('--columnar', help='ruta adicional en formato columnar (.parquet con pyarrow, '
+                                       'si no un directorio con un .npy por columna)')
+args = parser.parse_args()
 
-# Fix column name
-df = df.rename(columns={'ÿMunicipios': 'Municipios'})
+COLUMNS = ['Municipios', 'Sexo', 'Periodo', 'Total']
 
-# Filter for total population (all sexes)
-df = df[df['Sexo'] == 'Total']
 
-# Extract municipality code and name
-df['Codigo'] = df['Municipios'].str.split().str[0]
-df['Municipio'] = df['Municipios'].str.split().str[1:].str.join(' ')
+def split_municipios(s):
+    """(Codigo, Municipio) from INE labels such as '44001 Ababuj'."""
+    # Same normalisation as before: runs of whitespace inside the name collapse to one space
+    parts = s.str.split()
+    return parts.str[0], parts.str[1:].str.join(' ')
 
-# Convert to numeric
-df['Periodo'] = pd.to_numeric(df['Periodo'])
-df['Total'] = pd.to_numeric(df['Total'], errors='coerce')
 
-# Pivot the data
-result = df.pivot_table(index=['Codigo', 'Municipio'], columns='Periodo', values='Total', aggfunc='first')
-result = result.reset_index()
+def pivot_in_memory(path):
+    # Read the data (encoding, BOM and separators detected by ine_csv; '.' = miles)
+    df = read_ine_csv(path, numeric=['Total'], thousands='.', usecols=COLUMNS)
+
+    # Filter for total population (all sexes)
+    df = df[df['Sexo'] == 'Total']
+
+    # Extract municipality code and name
+    df['Codigo'], df['Municipio'] = split_municipios(df['Municipios'])
+
+    # Convert to numeric
+    df['Periodo'] = pd.to_numeric(df['Periodo'])
+
+    # Pivot the data
+    result = df.pivot_table(index=['Codigo', 'Municipio'], columns='Periodo', values='Total', aggfunc='first')
+    return result.reset_index()
+
+
+def pivot_streaming(path, chunksize):
+    """Same table as pivot_in_memory, built block by block.
+
+    Rows and year columns are assigned on first sight; as with
+    aggfunc='first', the first non-null value of a (municipality, year) wins.
+    """
+    row_of, col_of = {}, {}
+    values = np.full((1024, 8), np.nan)
+    n_rows = 0
+    integer = True
+    for chunk in iter_ine_csv(path, chunksize, numeric=['Total'], thousands='.', usecols=COLUMNS):
+        chunk = chunk[(chunk['Sexo'] == 'Total') & chunk['Total'].notna()]
+        if chunk.empty:
+            continue
+        integer &= pd.api.types.is_integer_dtype(chunk['Total'])
+        codes, names = split_municipios(chunk['Municipios'])
+        keys = list(zip(codes, names))
+        for k in dict.fromkeys(keys):
+            if k not in row_of:
+                row_of[k] = len(row_of)
+        for y in pd.unique(chunk['Periodo']):
+            if int(y) not in col_of:
+                col_of[int(y)] = len(col_of)
+        # Grow the accumulator geometrically when new municipalities or years appear
+        if len(row_of) > values.shape[0] or len(col_of) > values.shape[1]:
+            grown = np.full((max(len(row_of), 2 * values.shape[0]), max(len(col_of), 2 * values.shape[1])), np.nan)
+            grown[:values.shape[0], :values.shape[1]] = values
+            values = grown
+        r = np.fromiter((row_of[k] for k in keys), dtype=np.int64, count=len(keys))
+        c = chunk['Periodo'].astype(int).map(col_of).to_numpy()
+        v = chunk['Total'].to_numpy(dtype=float)
+        # Keep the first value of each cell: within the block, first occurrence; across blocks, empty cells only
+        cell = r * values.shape[1] + c
+        _, first = np.unique(cell, return_index=True)
+        first = first[np.isnan(values[r[first], c[first]])]
+        values[r[first], c[first]] = v[first]
+        n_rows += len(chunk)
+
+    keys = list(row_of)
+    years = sorted(col_of)
+    wide = values[:len(keys)][:, [col_of[y] for y in years]]
+    if integer and not np.isnan(wide).any():
+        # pivot_table keeps integer counts when no cell is missing
+        wide = wide.astype(np.int64)
+    result = pd.DataFrame(wide, columns=pd.Index(years, name='Periodo'))
+    result.insert(0, 'Codigo', [k[0] for k in keys])
+    result.insert(1, 'Municipio', [k[1] for k in keys])
+    print(f"{n_rows} filas 'Total' leídas en bloques de {chunksize}: {len(keys)} municipios x {len(years)} años")
+    # Same row order as pivot_table (sorted by index)
+    return result.sort_values(['Codigo', 'Municipio'], ignore_index=True)
+
+
+if args.chunksize > 0:
+    result = pivot_streaming(args.input, args.chunksize)
+else:
+    result = pivot_in_memory(args.input)
 
 # Save to file
-result.to_csv('evolucion_poblacion_wide.csv', sep=';', index=False)
-print("Data transformed and saved to evolucion_poblacion_wide.csv")
\ No newline at end of file
+result.to_csv(args.output, sep=';', index=False)
+print(f"Data transformed and saved to {args.output}")
+
+if args.columnar:
+    columnar = result.rename(columns=str)
+    if HAS_ARROW:
+        columnar.to_parquet(args.columnar, index=False)
+    else:
+        write_columns(args.columnar, columnar)
+    print(f"Columnar copy saved to {args.columnar}")
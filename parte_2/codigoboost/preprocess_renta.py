@@ -2,9 +2,10 @@
 Preprocess renta data file to convert it to the right format.
 """
 import pandas as pd
+from ine_csv import read_ine_csv
 
 # Read the data
-df = pd.read_csv('evolucion_renta.csv', sep=';')
+df = read_ine_csv('evolucion_renta.csv', numeric=['Total'])
 
 # Filter for "Renta neta media por persona"
 df = df[df['Indicadores de renta media'] == 'Renta neta media por persona']
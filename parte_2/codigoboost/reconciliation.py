@@ -0,0 +1,169 @@
+"""
+Hierarchical forecast reconciliation (municipality -> province -> national).
+Base forecasts made independently at each level do not add up. This applies
+WLS / diagonal-MinT reconciliation to every horizon at once in the
+constraint form
+
+    y~ = y^ - W C' (C W C')^-1 C y^,    C = [I  -A]
+
+where A is the sparse aggregation matrix (aggregates x leaves) and W the
+diagonal error variances. C W C' is only (aggregates x aggregates), so no
+dense leaves x leaves matrix is ever built.
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+from ine_csv import read_ine_csv
+
+WORKDIR = os.path.dirname(os.path.abspath(__file__))
+
+# Error variance given to aggregates without a base forecast: they follow their leaves
+MISSING_WEIGHT = 1e6
+
+
+def aggregation_matrix(leaf_codes, province_len=2):
+    """Sparse (1 + n_provinces) x n_leaves aggregation matrix from INE codes.
+
+    Row 0 is the national total; the province of a municipality is the first
+    `province_len` digits of its code. Returns (A, aggregate_names).
+    """
+    codes = np.asarray(leaf_codes, dtype=str)
+    provs, prov_idx = np.unique([c[:province_len] for c in codes], return_inverse=True)
+    n = len(codes)
+    rows = np.concatenate([np.zeros(n, dtype=int), 1 + prov_idx])
+    cols = np.concatenate([np.arange(n), np.arange(n)])
+    A = sp.csr_matrix((np.ones(2 * n), (rows, cols)), shape=(1 + len(provs), n))
+    return A, ['total'] + list(provs)
+
+
+def summing_matrix(A):
+    """S = [A; I]: maps leaves to every node of the hierarchy."""
+    return sp.vstack([A, sp.identity(A.shape[1], format='csr')], format='csr')
+
+
+def reconcile(base_agg, base_leaf, A, w_agg=None, w_leaf=None):
+    """Reconciled (aggregate, leaf) forecasts.
+
+    base_agg is (n_agg, H) and base_leaf (n_leaves, H); NaN aggregates have
+    no base forecast and are rebuilt from their leaves. w_agg / w_leaf are
+    the diagonal of W (error variances); None gives OLS (W = I).
+    Returns (agg, leaf) with agg == A @ leaf.
+    """
+    base_agg = np.atleast_2d(np.asarray(base_agg, dtype=float).T).T
+    base_leaf = np.atleast_2d(np.asarray(base_leaf, dtype=float).T).T
+    n_agg, n_leaf = A.shape
+    w_agg = np.ones(n_agg) if w_agg is None else np.asarray(w_agg, dtype=float).copy()
+    w_leaf = np.ones(n_leaf) if w_leaf is None else np.asarray(w_leaf, dtype=float)
+
+    bottom_up = A @ base_leaf
+    missing = np.isnan(base_agg)
+    base_agg = np.where(missing, bottom_up, base_agg)
+    w_agg[missing.any(axis=1)] = MISSING_WEIGHT * max(w_agg.max(), w_leaf.max())
+
+    # C y^ and C W C' = W_agg + A W_leaf A' (both small: one row per aggregate)
+    gap = base_agg - bottom_up
+    M = sp.diags(w_agg) + A @ sp.diags(w_leaf) @ A.T
+    lam = splu(sp.csc_matrix(M)).solve(gap)
+    agg = base_agg - w_agg[:, None] * lam
+    leaf = base_leaf + w_leaf[:, None] * (A.T @ lam)
+    return agg, leaf
+
+
+def structural_weights(A):
+    """WLS with W = diag(S 1): each node's variance ~ number of leaves under it."""
+    return np.asarray(A.sum(axis=1)).ravel(), np.ones(A.shape[1])
+
+
+def naive_mse(frame):
+    """Mean squared year-on-year change of the val_<year> columns of each row.
+
+    One-step error variance of a naive forecast, used as the diagonal of W.
+    """
+    vals = frame[sorted(c for c in frame.columns if c.startswith('val_'))].to_numpy(dtype=float)
+    return np.nanmean(np.diff(vals, axis=1) ** 2, axis=1)
+
+
+def reconcile_population(muni_path, prov_path=None, method='struct', province_len=2):
+    """Reconcile municipal and province population forecasts.
+
+    muni_path is poblacion_predictions_muni_gboost.csv (Codigo + pred_<year>),
+    prov_path is poblacion_predictions_prov_gboost.csv (PROV + pred_<year>);
+    provinces or the national total without a base forecast are bottom-up.
+    method 'ols', 'struct' (structural WLS) or 'var' (WLS on each node's own
+    naive_mse; aggregates without history get the sum of their leaves').
+    Only the horizons present in both files are reconciled.
+    """
+    muni = read_ine_csv(muni_path, dtype={'Codigo': str})
+    pred_cols = [c for c in muni.columns if c.startswith('pred_')]
+    prov = None
+    if prov_path and os.path.exists(prov_path):
+        prov = read_ine_csv(prov_path, dtype={'PROV': str}).set_index('PROV')
+        muni_cols, prov_cols = pred_cols, [c for c in prov.columns if c.startswith('pred_')]
+        pred_cols = [c for c in muni_cols if c in prov_cols]
+        if not pred_cols:
+            raise ValueError(f'no common horizons: municipal {muni_cols}, province {prov_cols}; '
+                             'rerun both with the same --horizons')
+        skipped = sorted(set(muni_cols) ^ set(prov_cols))
+        if skipped:
+            print(f'horizons not in both files, skipped: {skipped}')
+    muni = muni[muni[pred_cols].notna().all(axis=1)].reset_index(drop=True)
+    A, agg_names = aggregation_matrix(muni['Codigo'], province_len)
+
+    base_agg = pd.DataFrame(np.nan, index=agg_names, columns=pred_cols)
+    var_agg = pd.Series(np.nan, index=agg_names)
+    if prov is not None:
+        common = base_agg.index.intersection(prov.index)
+        base_agg.loc[common] = prov.loc[common, pred_cols].to_numpy()
+        var_agg.loc[common] = naive_mse(prov.loc[common])
+        print(f'{len(common)} province base forecasts, {len(agg_names) - 1 - len(common)} bottom-up')
+
+    if method == 'ols':
+        w_agg, w_leaf = None, None
+    elif method == 'struct':
+        w_agg, w_leaf = structural_weights(A)
+    elif method == 'var':
+        w_leaf = naive_mse(muni)
+        w_leaf = np.maximum(np.where(np.isnan(w_leaf), np.nanmedian(w_leaf), w_leaf), 1e-6)
+        # Aggregates without their own history: sum of leaf variances (independent errors)
+        w_agg = np.where(var_agg.isna(), A @ w_leaf, var_agg.to_numpy())
+        w_agg = np.maximum(w_agg, 1e-6)
+    else:
+        raise ValueError(f'unknown method {method!r}')
+
+    t0 = time.perf_counter()
+    agg, leaf = reconcile(base_agg.to_numpy(), muni[pred_cols].to_numpy(dtype=float), A, w_agg, w_leaf)
+    print(f'Reconciled {A.shape[1]} municipalities, {A.shape[0] - 1} provinces and the total '
+          f'for {len(pred_cols)} horizons in {(time.perf_counter() - t0) * 1000:.1f} ms')
+
+    out = pd.concat([
+        pd.DataFrame({'level': ['national'] + ['province'] * (len(agg_names) - 1), 'code': agg_names}),
+        pd.DataFrame({'level': 'municipality', 'code': muni['Codigo']}),
+    ], ignore_index=True)
+    base = np.vstack([base_agg.to_numpy(), muni[pred_cols].to_numpy(dtype=float)])
+    rec = np.vstack([agg, leaf])
+    for j, c in enumerate(pred_cols):
+        out[f'base_{c}'] = base[:, j]
+        out[c] = rec[:, j]
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reconcile municipal and province population forecasts.')
+    parser.add_argument('--muni', default=os.path.join(WORKDIR, 'poblacion_predictions_muni_gboost.csv'),
+                        help='municipal forecasts with INE Codigo (predict_trends_gboost.py --pop-level muni)')
+    parser.add_argument('--prov', default=os.path.join(WORKDIR, 'poblacion_predictions_prov_gboost.csv'),
+                        help='province forecasts with PROV code (predict_trends_gboost.py)')
+    parser.add_argument('--method', choices=['ols', 'struct', 'var'], default='struct',
+                        help='W: identity, structural (leaf counts) or CV error variances')
+    args = parser.parse_args()
+
+    if os.path.exists(args.muni):
+        out = reconcile_population(args.muni, args.prov, args.method)
+        out.to_csv(os.path.join(WORKDIR, 'poblacion_predictions_reconciled.csv'), index=False)
+        print('Saved poblacion_predictions_reconciled.csv')
+    else:
+        print('municipal forecasts not found:', args.muni)
@@ -0,0 +1,54 @@
+"""
+Scaling report for municipality-level population forecasting.
+Runs the global GBoost forecast on growing subsets of the INE municipalities and
+records series count, panel rows, wall time and peak memory.
+"""
+import os
+import time
+import argparse
+import tracemalloc
+import pandas as pd
+from predict_trends_gboost import (WORKDIR, TARGET_YEARS, GLOBAL_FIT_ROWS,
+                                   load_population_municipal, train_and_predict_global)
+
+SIZES = [100, 500, 1000, 2000, 4000, 8000]
+
+def scaling_report(path, sizes=SIZES, fit_rows=GLOBAL_FIT_ROWS):
+    """Time train_and_predict_global on the first n municipalities for each n."""
+    wide = load_population_municipal(path)
+    years = list(wide.columns)
+    values = wide.to_numpy(dtype=float)
+
+    rows = []
+    for n in sorted(set(min(n, len(values)) for n in sizes)):
+        series = [(years, vals) for vals in values[:n]]
+        # Timed and memory-traced in separate passes: tracemalloc slows pandas down
+        t0 = time.perf_counter()
+        train_and_predict_global(series, TARGET_YEARS, fit_rows)
+        elapsed = time.perf_counter() - t0
+        tracemalloc.start()
+        train_and_predict_global(series, TARGET_YEARS, fit_rows)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rows.append({'n_series': n, 'n_years': len(years), 'panel_rows': n * len(years),
+                     'seconds': round(elapsed, 3), 'peak_mb': round(peak / 2**20, 1)})
+        print(f"{n:>6} series  {elapsed:8.2f}s  {peak / 2**20:8.1f} MB")
+
+    report = pd.DataFrame(rows)
+    report.to_csv(os.path.join(WORKDIR, 'scaling_poblacion_municipal.csv'), index=False)
+    print('Saved scaling_poblacion_municipal.csv')
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scaling report for municipal population forecasts.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='numbers of municipalities to time')
+    parser.add_argument('--fit-rows', type=int, default=GLOBAL_FIT_ROWS,
+                        help='panel rows the global model is fitted on (sizes the fit only, not the run time)')
+    args = parser.parse_args()
+
+    poblacion_path = os.path.join(WORKDIR, 'evolucion_poblacion.csv')
+    if os.path.exists(poblacion_path):
+        scaling_report(poblacion_path, args.sizes, args.fit_rows)
+    else:
+        print('poblacion file not found:', poblacion_path)
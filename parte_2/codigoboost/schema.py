@@ -0,0 +1,155 @@
+"""
+Canonical compact schema for the municipality tables (poblacion_total_merged.csv,
+municipios_priorizados_*.csv and the like).
+
+- PROVINCIA / Provincias: categorical (52 values instead of one string per row)
+- CPRO + CMUN: one packed int32 code, CODMUN = CPRO * 1000 + CMUN, which is
+  also the integer value of the 5-digit INE code ('03140' -> 3140)
+- population (POBxx, Poblacion*, HOMBRES, MUJERES, CRECIMIENTO_NETO): int32,
+  or float32 when a column has gaps or fractional predictions
+- income / rent (renta_media, renta_20xx, alquiler_m2, alquiler_20xx, year
+  columns '2015'...'2030'): float32
+- num_bancos: int16
+
+Zero-padded CPRO / CMUN strings are only rebuilt (code_strings / expand_codes)
+when a file that other tools read has to be written.
+
+    python schema.py poblacion_total_merged.csv ../predecir2026/municipios_priorizados_2026.csv
+prints the before/after memory report of each file.
+"""
+import os
+import re
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+from ine_csv import HAS_ARROW
+from csv_cache import read_csv_cached, write_columns
+
+CODE_COL = 'CODMUN'
+CATEGORY_COLS = ['PROVINCIA', 'Provincias']
+
+_POPULATION = re.compile(r'^(POB\d{2}|Poblacion.*|HOMBRES|MUJERES|CRECIMIENTO_NETO)$')
+_MONEY = re.compile(r'^(\d{4}|renta(_media|_\d{4})?|alquiler(_m2|_\d{4})?)$')
+_COUNT = re.compile(r'^num_bancos$')
+
+
+def pack_code(cpro, cmun):
+    """Packed int32 code CPRO * 1000 + CMUN; accepts strings ('03', '140') or numbers."""
+    cpro = pd.to_numeric(pd.Series(cpro), errors='coerce').to_numpy(dtype=float)
+    cmun = pd.to_numeric(pd.Series(cmun), errors='coerce').to_numpy(dtype=float)
+    code = cpro * 1000 + cmun
+    if np.isnan(code).any():
+        raise ValueError('CPRO/CMUN no numérico: no se puede empaquetar el código de municipio.')
+    return code.astype(np.int32)
+
+
+def parse_code(codigo):
+    """Packed code from a 5-digit INE code string ('03140' -> 3140)."""
+    return pd.to_numeric(pd.Series(codigo), errors='raise').to_numpy().astype(np.int32)
+
+
+def code_strings(code):
+    """(CPRO, CMUN) zero-padded strings ('03', '140') of packed codes."""
+    code = np.asarray(code, dtype=np.int32)
+    cpro = pd.Series(code // 1000).astype(str).str.zfill(2)
+    cmun = pd.Series(code % 1000).astype(str).str.zfill(3)
+    return cpro.to_numpy(), cmun.to_numpy()
+
+
+def expand_codes(df, code_col=CODE_COL):
+    """Copy of df with CPRO / CMUN strings in place of the packed code (for CSV outputs)."""
+    out = df.copy()
+    pos = out.columns.get_loc(code_col)
+    cpro, cmun = code_strings(out.pop(code_col))
+    out.insert(pos, 'CMUN', cmun)
+    out.insert(pos, 'CPRO', cpro)
+    return out
+
+
+def _narrow_int(s, dtype):
+    """s as dtype if every value is a whole number that fits, else None."""
+    values = pd.to_numeric(s, errors='coerce')
+    if values.isna().any():
+        return None
+    arr = values.to_numpy(dtype=float)
+    info = np.iinfo(dtype)
+    if not np.all(arr == np.round(arr)) or arr.min(initial=0) < info.min or arr.max(initial=0) > info.max:
+        return None
+    return arr.astype(dtype)
+
+
+def compact(df):
+    """df converted to the canonical schema (see module docstring); returns a new frame."""
+    out = df.copy()
+    if CODE_COL in out.columns:
+        out[CODE_COL] = out[CODE_COL].astype(np.int32)
+        out = out.drop(columns=[c for c in ('CPRO', 'CMUN') if c in out.columns])
+    elif 'CPRO' in out.columns and 'CMUN' in out.columns:
+        pos = out.columns.get_loc('CPRO')
+        code = pack_code(out.pop('CPRO'), out.pop('CMUN'))
+        out.insert(pos, CODE_COL, code)
+    for col in out.columns:
+        s = out[col]
+        if col in CATEGORY_COLS:
+            out[col] = s.astype('category')
+        elif _POPULATION.match(col):
+            as_int = _narrow_int(s, np.int32)
+            out[col] = as_int if as_int is not None else pd.to_numeric(s, errors='coerce').astype(np.float32)
+        elif _MONEY.match(col):
+            out[col] = pd.to_numeric(s, errors='coerce').astype(np.float32)
+        elif _COUNT.match(col):
+            as_int = _narrow_int(s, np.int16)
+            out[col] = as_int if as_int is not None else pd.to_numeric(s, errors='coerce').astype(np.float32)
+    return out
+
+
+def memory_report(before, after):
+    """Per-column dtype and bytes (deep) of two versions of a table, plus the total."""
+    b = before.memory_usage(deep=True, index=False)
+    a = after.memory_usage(deep=True, index=False)
+    rows = []
+    for col in after.columns:
+        src = [col] if col in before.columns else [c for c in ('CPRO', 'CMUN') if c in before.columns]
+        rows.append({'columna': col,
+                     'dtype_antes': '+'.join(str(before[c].dtype) for c in src),
+                     'dtype_despues': str(after[col].dtype),
+                     'bytes_antes': int(sum(b[c] for c in src)),
+                     'bytes_despues': int(a[col])})
+    report = pd.DataFrame(rows)
+    total = {'columna': 'TOTAL', 'dtype_antes': '', 'dtype_despues': '',
+             'bytes_antes': int(b.sum()), 'bytes_despues': int(a.sum())}
+    report = pd.concat([report, pd.DataFrame([total])], ignore_index=True)
+    report['ratio'] = (report['bytes_despues'] / report['bytes_antes']).round(3)
+    return report
+
+
+def load_compact(path, columns=None, **read_kwargs):
+    """read_csv_cached(path) with CPRO / CMUN kept as text, converted to the canonical schema."""
+    read_kwargs.setdefault('dtype', {'CPRO': str, 'CMUN': str})
+    return compact(read_csv_cached(path, columns=columns, **read_kwargs))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Esquema compacto: informe de memoria antes/después.')
+    parser.add_argument('paths', nargs='+', help='CSV de municipios')
+    parser.add_argument('--output-dir', help='guardar cada tabla compacta (Parquet si hay pyarrow, si no columnas .npy)')
+    args = parser.parse_args()
+
+    for path in args.paths:
+        before = read_csv_cached(path, dtype={'CPRO': str, 'CMUN': str})
+        after = compact(before)
+        report = memory_report(before, after)
+        print(f'\n{path}: {len(before)} filas')
+        print(report.to_string(index=False))
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            stem = os.path.splitext(os.path.basename(path))[0]
+            if HAS_ARROW:
+                dest = os.path.join(args.output_dir, stem + '.parquet')
+                after.to_parquet(dest, index=False)
+            else:
+                dest = os.path.join(args.output_dir, stem + '.cols')
+                shutil.rmtree(dest, ignore_errors=True)
+                write_columns(dest, after)
+            print('Guardado', dest)
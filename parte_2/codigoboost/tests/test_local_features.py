@@ -0,0 +1,32 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from predict_trends_gboost import create_features, local_features
+
+COLS = ['year', 'value', 'year_norm', 'value_lag1', 'value_lag2', 'growth_1y', 'growth_2y',
+        'roll_mean_2y', 'roll_std_2y', 'ewm_mean']
+
+
+def _check(series):
+    for (years, vals), feats in zip(series, local_features(series)):
+        expected = create_features(years, vals)[COLS].reset_index(drop=True)
+        pd.testing.assert_frame_equal(feats[COLS].reset_index(drop=True), expected, check_dtype=False)
+
+
+def test_common_years_match_create_features():
+    rng = np.random.default_rng(0)
+    years = np.arange(2015, 2024)
+    values = 1000 * np.exp(np.cumsum(rng.normal(0.01, 0.03, (6, len(years))), axis=1))
+    values[2, 4] = np.nan
+    values[3, 0] = 0.0
+    _check([(years, v) for v in values])
+
+
+def test_mixed_years_match_create_features():
+    series = [(np.arange(2015, 2024), np.linspace(50, 90, 9)),
+              (np.array([2018, 2016, 2017, 2020]), np.array([7.0, 5.0, 6.0, 9.0])),
+              (np.arange(2010, 2012), np.array([3.0, 4.0]))]
+    _check(series)
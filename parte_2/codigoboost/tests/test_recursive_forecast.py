@@ -0,0 +1,30 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from predict_trends_gboost import create_features, recursive_forecast, STATE_COLS
+
+
+def _last(values, years):
+    return create_features(years, values)[STATE_COLS].values[-1]
+
+
+def test_in_history_horizon_is_not_a_forecast():
+    years = np.arange(2015, 2024)
+    last = _last(np.linspace(100, 140, len(years)), years)
+    preds = recursive_forecast(lambda X: X[:, 1] + 1, last, 2015, 2023, [2020, 2023, 2024, 2026])
+    assert np.isnan(preds[2020][0])
+    assert preds[2023][0] == 140
+    assert preds[2024][0] == 141
+    assert preds[2026][0] == 143
+
+
+def test_in_history_horizon_with_mixed_year_max():
+    years = np.arange(2015, 2024)
+    last = np.vstack([_last(np.full(len(years), 50.0), years),
+                      _last(np.full(len(years) - 2, 80.0), years[:-2])])
+    preds = recursive_forecast(lambda X: X[:, 1] + 1, last, 2015, np.array([2023, 2021]), [2021, 2022, 2024])
+    assert np.isnan(preds[2021][0]) and preds[2021][1] == 80
+    assert np.isnan(preds[2022][0]) and preds[2022][1] == 81
+    assert preds[2024].tolist() == [51, 83]
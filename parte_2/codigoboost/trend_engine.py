@@ -0,0 +1,185 @@
+"""
+Batched linear trend engine.
+Fits a straight line to every series of a (series x year) matrix with one
+vectorized least-squares solve and predicts any list of target years with one matrix multiply.
+Prediction intervals come from a residual bootstrap run as one tensor operation.
+"""
+import numpy as np
+
+
+def fit_trends(years, values):
+    """Fit value = intercept + slope * year for every row of `values`.
+
+    `values` has shape (n_series, n_years). Rows containing NaN cannot be fitted
+    and get NaN coefficients. Returns an array of shape (n_series, 2) with
+    [intercept, slope] per series.
+    """
+    x = np.asarray(years, dtype=float).ravel()
+    Y = np.atleast_2d(np.asarray(values, dtype=float))
+    valid = ~np.isnan(Y).any(axis=1)
+
+    # Centred design: the normal equations decouple, so the whole batch is
+    # solved with one matrix-vector product (same estimator as LinearRegression)
+    x_mean = x.mean()
+    xc = x - x_mean
+
+    coefs = np.full((Y.shape[0], 2), np.nan)
+    if valid.any():
+        Yv = Y[valid]
+        y_mean = Yv.mean(axis=1)
+        slope = (Yv - y_mean[:, None]) @ xc / (xc @ xc)
+        coefs[valid, 0] = y_mean - slope * x_mean
+        coefs[valid, 1] = slope
+    return coefs
+
+
+def predict_trends(coefs, target_years):
+    """Evaluate fitted trends at `target_years`. Returns (n_series, n_targets)."""
+    t = np.asarray(target_years, dtype=float).ravel()
+    T = np.column_stack([np.ones_like(t), t])
+    return coefs @ T.T
+
+
+# Years are offset by this origin before accumulating sums (numerical stability)
+STATS_ORIGIN = 2000
+
+
+def trend_stats(years, values):
+    """Sufficient statistics [n, Σx, Σy, Σxy, Σx²] of each row of `values`.
+
+    x is the year minus STATS_ORIGIN. NaN values propagate, so series with
+    missing data end up with NaN trends, as in fit_trends.
+    """
+    x = np.asarray(years, dtype=float).ravel() - STATS_ORIGIN
+    Y = np.atleast_2d(np.asarray(values, dtype=float))
+    ones = np.ones(Y.shape[0])
+    return np.column_stack([ones * len(x), ones * x.sum(), Y.sum(axis=1), Y @ x, ones * (x @ x)])
+
+
+def update_stats(stats, year, new_values):
+    """Add one year of observations to `stats` in place (O(1) per series)."""
+    x = float(year - STATS_ORIGIN)
+    y = np.asarray(new_values, dtype=float)
+    stats[:, 0] += 1
+    stats[:, 1] += x
+    stats[:, 2] += y
+    stats[:, 3] += x * y
+    stats[:, 4] += x * x
+    return stats
+
+
+def trends_from_stats(stats):
+    """[intercept, slope] per series from sufficient statistics (same as fit_trends)."""
+    n, sx, sy, sxy, sxx = stats.T
+    slope = (n * sxy - sx * sy) / (n * sxx - sx ** 2)
+    intercept = (sy - slope * sx) / n - slope * STATS_ORIGIN
+    return np.column_stack([intercept, slope])
+
+
+def save_trend_store(path, names, stats, last_year):
+    """Write series names, statistics and last observed year to a compact .npz."""
+    np.savez_compressed(path, names=np.asarray(names, dtype=str), stats=stats, last_year=last_year)
+
+
+def load_trend_store(path):
+    """Read a store written by save_trend_store. Returns (names, stats, last_year)."""
+    with np.load(path) as z:
+        return z['names'], z['stats'].copy(), int(z['last_year'])
+
+
+def bootstrap_intervals(years, values, target_years, n_boot=200, quantiles=(10, 50, 90),
+                        seed=0, chunk_size=2000, coefs=None):
+    """Residual-bootstrap prediction intervals of the linear trend of every row.
+
+    For each resample the leverage-adjusted residuals of each series are
+    redrawn with replacement, the line is refitted and a further resampled
+    residual is added at every target year. All resamples are processed
+    together as a (resample x series x year) tensor; series are taken in chunks
+    of `chunk_size` to bound memory. Returns an array of shape
+    (len(quantiles), n_series, n_targets); rows with NaN get NaN.
+    `coefs` centres the bands on given trends (e.g. shrink_trends) instead of
+    the OLS fit; residuals are then taken around those trends.
+    """
+    x = np.asarray(years, dtype=float).ravel()
+    t = np.asarray(target_years, dtype=float).ravel()
+    Y = np.atleast_2d(np.asarray(values, dtype=float))
+    n_series, n_years = Y.shape
+    coefs = fit_trends(x, Y) if coefs is None else np.asarray(coefs, dtype=float)
+    point = predict_trends(coefs, t)
+    resid = Y - predict_trends(coefs, x)
+    xc = x - x.mean()
+    # Distance of each target year from the centre of the fitted years
+    tc = t - x.mean()
+    # Raw residuals underestimate the noise: rescale by leverage and recentre
+    leverage = 1 / n_years + xc ** 2 / (xc @ xc)
+    resid = resid / np.sqrt(1 - leverage)
+    resid -= resid.mean(axis=1, keepdims=True)
+
+    rng = np.random.default_rng(seed)
+    out = np.full((len(quantiles), n_series, len(t)), np.nan)
+    for start in range(0, n_series, chunk_size):
+        rows = slice(start, min(start + chunk_size, n_series))
+        e = resid[rows]
+        m = e.shape[0]
+        r = np.arange(m)[None, :, None]
+        # Refit on fitted + resampled residuals: by linearity only the residual
+        # part moves the line, so the refit reduces to two tensor contractions
+        e_star = e[r, rng.integers(0, n_years, size=(n_boot, m, n_years))]
+        shift = e_star.mean(axis=2)
+        dslope = e_star @ xc / (xc @ xc)
+        noise = e[r, rng.integers(0, n_years, size=(n_boot, m, len(t)))]
+        sims = point[rows] + shift[:, :, None] + dslope[:, :, None] * tc + noise
+        out[:, rows] = np.percentile(sims, quantiles, axis=0)
+    return out
+
+
+def shrink_trends(years, values, groups, min_group=3):
+    """Empirical-Bayes linear trends: each slope is shrunk toward its group's prior.
+
+    Slopes are compared relative to the series mean (growth per year), so
+    small and large municipalities share one prior per group. Per group the
+    prior mean and between-series variance tau² come from the method of
+    moments; each series keeps the weight tau² / (tau² + v) on its own slope,
+    v being its OLS sampling variance. Groups with fewer than `min_group`
+    fitted series use the prior of all series. Everything is computed with
+    grouped sums (np.bincount), no loop over series or groups.
+    Returns (coefs (n_series, 2) like fit_trends, shrinkage weight (n_series,)).
+    """
+    x = np.asarray(years, dtype=float).ravel()
+    Y = np.atleast_2d(np.asarray(values, dtype=float))
+    coefs = fit_trends(x, Y)
+    xc = x - x.mean()
+    y_mean = Y.mean(axis=1)
+    resid = Y - predict_trends(coefs, x)
+    var_slope = (resid ** 2).sum(axis=1) / (len(x) - 2) / (xc @ xc)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = coefs[:, 1] / y_mean
+        v = var_slope / y_mean ** 2
+    ok = np.isfinite(r) & np.isfinite(v)
+
+    _, g = np.unique(np.asarray(groups, dtype=str), return_inverse=True)
+    G = g.max() + 1 if len(g) else 0
+
+    def moments(idx, n_groups):
+        n = np.bincount(idx, minlength=n_groups)
+        mean = np.bincount(idx, r[ok], n_groups) / np.maximum(n, 1)
+        spread = np.bincount(idx, (r[ok] - mean[idx]) ** 2, n_groups) / np.maximum(n - 1, 1)
+        tau2 = np.maximum(spread - np.bincount(idx, v[ok], n_groups) / np.maximum(n, 1), 0)
+        # Precision-weighted prior mean given tau²
+        w = 1 / (v[ok] + tau2[idx] + 1e-18)
+        mean = np.bincount(idx, w * r[ok], n_groups) / np.maximum(np.bincount(idx, w, n_groups), 1e-18)
+        return n, mean, tau2
+
+    n_g, mu_g, tau2_g = moments(g[ok], G)
+    _, mu_all, tau2_all = moments(np.zeros(ok.sum(), dtype=int), 1)
+    small = n_g < min_group
+    mu_g[small], tau2_g[small] = mu_all[0], tau2_all[0]
+
+    weight = np.full(len(Y), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight[ok] = np.where(tau2_g[g[ok]] + v[ok] > 0, tau2_g[g[ok]] / (tau2_g[g[ok]] + v[ok]), 1.0)
+    r_shrunk = weight * r + (1 - weight) * mu_g[g]
+    out = coefs.copy()
+    out[ok, 1] = r_shrunk[ok] * y_mean[ok]
+    out[ok, 0] = y_mean[ok] - out[ok, 1] * x.mean()
+    return out, weight
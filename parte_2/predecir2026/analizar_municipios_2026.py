@@ -1,36 +1,58 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 
+# Lector común de CSV (formato detectado una vez) en parte_2/codigoboost
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'codigoboost'))
+from ine_csv import read_ine_csv
+from csv_cache import read_csv_cached
+from schema import load_compact, parse_code, expand_codes
+from muni_index import attach_codes
+
 print("Cargando datos...")
 
 # 1. Cargar datos originales de municipios con códigos
 try:
-    municipios_info = pd.read_csv('municipios_sin_bancos.csv')
+    # Esquema compacto: CODMUN (CPRO*1000+CMUN) int32 en lugar de CPRO/CMUN con zfill
+    municipios_info = load_compact('municipios_sin_bancos.csv')
     print(f"Información de municipios cargada: {len(municipios_info)} municipios")
     
-    # Asegurar formato correcto de códigos
-    municipios_info['CPRO'] = municipios_info['CPRO'].astype(str).str.zfill(2)
-    municipios_info['CMUN'] = municipios_info['CMUN'].astype(str).str.zfill(3)
-    
     # 2. Cargar predicciones de población
-    poblacion_pred = pd.read_csv('municipios_predicciones.csv', encoding='latin1')
-    print(f"Predicciones de población cargadas: {len(poblacion_pred)} municipios")
-    
-    # Unir datos
-    poblacion = pd.merge(
-        municipios_info[['CPRO', 'CMUN', 'NOMBRE', 'PROVINCIA', 'num_bancos']],
-        poblacion_pred[['Municipios', '2026']],
-        left_on='NOMBRE',
-        right_on='Municipios',
-        how='inner'
-    )
+    if os.path.exists('poblacion_predictions_muni_gboost.csv'):
+        # Predicción GBoost municipal (predict_trends_gboost.py --pop-level muni), unida por código INE
+        poblacion_pred = read_ine_csv('poblacion_predictions_muni_gboost.csv', dtype={'Codigo': str})
+        print(f"Predicciones GBoost de población cargadas: {len(poblacion_pred)} municipios")
+        poblacion_pred = poblacion_pred.rename(columns={'pred_2026': '2026'})
+        poblacion_pred['CODMUN'] = parse_code(poblacion_pred['Codigo'])
+        poblacion = pd.merge(
+            municipios_info[['CODMUN', 'NOMBRE', 'PROVINCIA', 'num_bancos']],
+            poblacion_pred[['CODMUN', '2026']],
+            on='CODMUN',
+            how='inner'
+        )
+    else:
+        # Alternativa: tendencia lineal de gboost_pred_poblacion.py, solo con nombre
+        poblacion_pred = read_csv_cached('municipios_predicciones.csv', columns=['Municipios', '2026'])
+        print(f"Predicciones de población cargadas: {len(poblacion_pred)} municipios")
+        # Nombre -> CODMUN con el índice de municipios (informa de los que no se resuelven)
+        poblacion_pred = attach_codes(poblacion_pred, 'Municipios', population_col='2026',
+                                      label='municipios_predicciones.csv')
+        
+        # Unir datos
+        poblacion = pd.merge(
+            municipios_info[['CODMUN', 'NOMBRE', 'PROVINCIA', 'num_bancos']],
+            poblacion_pred[['CODMUN', '2026']],
+            on='CODMUN',
+            how='inner'
+        )
 except Exception as e:
     print(f"Error al cargar municipios_predicciones.csv: {e}")
     poblacion = pd.DataFrame()
 
 # 2. Cargar predicciones de renta
 try:
-    renta = pd.read_csv('prediccion_renta.csv', sep=',', encoding='latin1')
+    renta = read_ine_csv('prediccion_renta.csv')
     print(f"Predicciones de renta cargadas: {len(renta)} provincias")
 
     # Mapeo de nombres de provincia a códigos
@@ -51,8 +73,8 @@ try:
         'Melilla': '52'
     }
 
-    # Crear mapa de códigos a predicciones de renta 2026
-    renta['CPRO'] = renta['Provincias'].map(provincia_codes)
+    # Crear mapa de códigos a predicciones de renta 2026 (CPRO numérico = CODMUN // 1000)
+    renta['CPRO'] = pd.to_numeric(renta['Provincias'].map(provincia_codes))
     renta_2026_map = renta.set_index('CPRO')['2026'].to_dict()
     
 except Exception as e:
@@ -62,14 +84,14 @@ except Exception as e:
 # Crear DataFrame base con municipios y predicciones
 if not poblacion.empty:
     # Usar predicción 2026 como población
-    municipios = poblacion[['CPRO', 'CMUN', 'NOMBRE', 'PROVINCIA', '2026', 'num_bancos']].copy()
+    municipios = poblacion[['CODMUN', 'NOMBRE', 'PROVINCIA', '2026', 'num_bancos']].copy()
     municipios = municipios.rename(columns={'2026': 'Poblacion_2026'})
     
     # Convertir población a numérico
     municipios['Poblacion_2026'] = pd.to_numeric(municipios['Poblacion_2026'], errors='coerce')
     
     # Añadir predicciones de renta por provincia
-    municipios['renta_2026'] = municipios['CPRO'].map(renta_2026_map)
+    municipios['renta_2026'] = (municipios['CODMUN'] // 1000).map(renta_2026_map)
     
     # Filtrar municipios con más de 6000 habitantes predichos y sin bancos actuales
     municipios_candidatos = municipios[
@@ -121,7 +143,8 @@ if not poblacion.empty:
         print(f"   Score total: {r['score_total']:.3f}")
 
     # Guardar resultados
-    mejores[['CPRO', 'CMUN', 'NOMBRE', 'PROVINCIA', 'Poblacion_2026', 'renta_2026', 'score_total']].to_csv(
+    # CPRO/CMUN con ceros a la izquierda solo en el CSV de salida
+    expand_codes(mejores[['CODMUN', 'NOMBRE', 'PROVINCIA', 'Poblacion_2026', 'renta_2026', 'score_total']]).to_csv(
         'municipios_priorizados_2026.csv', 
         index=False
     )
@@ -1,3 +1,5 @@
+import os
+import sys
 import pandas as pd
 import folium
 from folium.plugins import HeatMap
@@ -5,11 +7,15 @@ from geopy.geocoders import Nominatim
 from geopy.extra.rate_limiter import RateLimiter
 from tqdm import tqdm
 
+# Lector común de CSV (formato detectado una vez) en parte_2/codigoboost
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'codigoboost'))
+from ine_csv import read_ine_csv
+
 # Ruta al archivo CSV
 csv_path = r"C:\Users\clara\Documentos\3º GED\predicciones\municipios_priorizados_2026.csv"
 
 # Cargar datos
-df = pd.read_csv(csv_path)
+df = read_ine_csv(csv_path)
 df = df[df['score_total'].notnull()]
 
 # Geolocalización
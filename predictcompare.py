@@ -1,3 +1,6 @@
+import os
+import sys
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -5,8 +8,27 @@ from xgboost import XGBRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error
 
+# Registro de modelos compartido con parte_2/codigoboost
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parte_2', 'codigoboost'))
+from model_registry import ModelRegistry
+from forecast_cache import cache_key
+from deficit_engine import deficit_table, top_deficit
+from bancos_tuning import PARAMS_PATH, successive_halving, save_params, load_params
+from csv_cache import read_csv_cached
+from schema import compact
+
+REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_registry')
+
+parser = argparse.ArgumentParser(description='Déficit de oficinas bancarias a 2026, 2028 y 2030.')
+parser.add_argument('--tune', action='store_true',
+                    help='buscar hiperparámetros (successive halving, folds por PROVINCIA) antes de entrenar')
+parser.add_argument('--candidates', type=int, default=27,
+                    help='configuraciones iniciales de la búsqueda (con --tune)')
+args = parser.parse_args()
+
 # --- 1. Cargar CSV ---
-df = pd.read_csv('poblacion_total_merged.csv', delimiter=',', encoding='utf-8')
+# Esquema compacto: PROVINCIA categórica, población int32, renta float32
+df = compact(read_csv_cached('poblacion_total_merged.csv'))
 
 # --- 2. Limpieza mínima ---
 if 'CRECIMIENTO_NETO' in df.columns:
@@ -60,51 +82,60 @@ X, y = X[mask], y[mask]
 df_clean = df.copy().loc[mask]
 df_clean[muni_col] = df_clean[muni_col].astype(str)
 
-# --- 7. Entrenar modelo ---
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-model = XGBRegressor(
+# --- 7. Entrenar modelo (o reutilizarlo del registro si los datos no han cambiado) ---
+if args.tune:
+    print("Buscando hiperparámetros...")
+    best = successive_halving(X, y, df_clean['PROVINCIA'].cat.codes.to_numpy(), n_candidates=args.candidates)
+    save_params(best)
+    print(f"Mejor configuración (MAE CV {best['cv_mae']:.3f}) guardada en {PARAMS_PATH}")
+
+# Hiperparámetros ajustados con --tune si existen; si no, los fijos de siempre
+params = load_params(default=dict(
     n_estimators=400,
     learning_rate=0.05,
     max_depth=6,
     subsample=0.9,
     colsample_bytree=0.9,
     random_state=42
-)
-model.fit(X_train, y_train)
-mae = mean_absolute_error(y_test, model.predict(X_test))
+))
+registry = ModelRegistry(REGISTRY_DIR)
+data_hash = cache_key('bancos_xgb', X.values, y.values, list(X.columns), base_year, params)
+entry = registry.lookup('bancos_xgb', data_hash)
+if entry is None:
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = XGBRegressor(**params)
+    model.fit(X_train, y_train)
+    mae = mean_absolute_error(y_test, model.predict(X_test))
+    registry.save('bancos_xgb', model, data_hash, params=params,
+                  metrics={'mae': mae, 'base_year': base_year}, features=list(X.columns))
+    print("Modelo entrenado y guardado en el registro")
+else:
+    model = entry.model
+    mae = entry.meta['metrics']['mae']
+    print("Modelo cargado del registro (datos sin cambios)")
 print(f"MAE (año base {base_year}): {mae:.2f}")
 
-# --- 8. Predicción por horizontes ---
+# --- 8. Predicción por horizontes (todos los años en una sola llamada a predict) ---
 horizontes = [2026, 2028, 2030]
-tops = {}
+deficit = deficit_table(model, df_clean, horizontes, muni_col=muni_col)
+deficit.to_csv('deficit_bancos_horizontes.csv', index=False)
 
-for year in horizontes:
-    pob_col, renta_col = check_cols(year)
-    X_pred = pd.DataFrame({
-        'poblacion': pd.to_numeric(df_clean[pob_col], errors='coerce'),
-        'renta': pd.to_numeric(df_clean[renta_col], errors='coerce')
-    })
-    preds = model.predict(X_pred).round(2)
-    df_clean[f'prediccion_bancos_{year}'] = preds
-    df_clean[f'diferencia_{year}'] = df_clean['num_bancos'] - df_clean[f'prediccion_bancos_{year}']
-
-    top10 = df_clean.sort_values(by=f'diferencia_{year}', ascending=True).head(10)
-    tops[year] = top10[[muni_col, 'num_bancos', f'prediccion_bancos_{year}', f'diferencia_{year}']]
+top = top_deficit(deficit, k=10)
+tops = {year: g.reset_index(drop=True) for year, g in top.groupby('year', sort=False)}
 
+for year in horizontes:
     print(f"\n--- Top 10 déficit {year} ---")
-    print(tops[year])
+    print(tops[year][['municipality', 'num_bancos', 'predicted_banks', 'deficit']])
 
 # --- 9. Gráfico comparativo ---
 fig, axes = plt.subplots(1, 3, figsize=(20, 6), sharey=True)
 pal = sns.color_palette('Reds_r', n_colors=len(horizontes))
 
 for ax, (year, color) in zip(axes, zip(horizontes, pal)):
-    df_top = df_clean.sort_values(by=f'diferencia_{year}', ascending=True).head(10)
-
     sns.barplot(
-        x=muni_col,
-        y=f'diferencia_{year}',
-        data=df_top,
+        x='municipality',
+        y='deficit',
+        data=tops[year],
         color=color,
         ax=ax
     )